@@ -0,0 +1,49 @@
+"""
+Configuration Export
+Writes the rendered configuration of each sheet to a text file as soon as the
+sheet is rendered, one file per device sheet, so the configuration does not
+have to go through the workbook.
+"""
+from pathlib import Path
+
+FILE_SUFFIX = ".cfg"
+# Write buffer of each export file
+BUFFER_SIZE = 1024 * 1024
+ROW_HEADER = "! {sheet} row {row} - {interface}\n"
+
+
+class ConfigExporter:
+    """
+    Writes the configuration of a sheet to <export_dir>/<sheet name>.cfg.
+    With export_only the configuration is not written to the workbook.
+    """
+
+    def __init__(self, export_dir, export_only=False):
+        self.export_dir = Path(export_dir)
+        self.export_dir.mkdir(parents=True, exist_ok=True)
+        self.export_only = export_only
+        self.files = 0
+        self.rows = 0
+
+
+    def get_file_path(self, sheet_name):
+        """Returns the export file of a sheet"""
+        return self.export_dir / (sheet_name + FILE_SUFFIX)
+
+
+    def write_sheet(self, sheet, row_values):
+        """Writes the (row, configuration) pairs of a sheet in one buffered pass,
+        in row order as the rows come rendered by template"""
+        if not row_values:
+            return
+        with open(self.get_file_path(sheet.name), "w", buffering=BUFFER_SIZE) as filehandle:
+            filehandle.writelines(self.__get_lines(sheet, sorted(row_values, key=lambda item: item[0])))
+        self.files += 1
+        self.rows += len(row_values)
+
+
+    def __get_lines(self, sheet, row_values):
+        """Yields the row header and configuration of every row"""
+        for row, cfg in row_values:
+            yield ROW_HEADER.format(sheet=sheet.name, row=row, interface=sheet.get_value(1, row))
+            yield cfg.rstrip("\n") + "\n!\n"
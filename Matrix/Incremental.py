@@ -0,0 +1,87 @@
+"""
+Incremental Configuration Generation
+Keeps a fingerprint of every templated row in a sidecar file next to the
+workbook, rows that have not changed since the last run are not rendered.
+"""
+import json
+import hashlib
+from pathlib import Path
+
+SIDECAR_SUFFIX = ".fingerprints.json"
+SIDECAR_VERSION = 1
+
+
+def get_sidecar_path(xls_file_name):
+    """Returns the path of the fingerprint file kept next to a workbook"""
+    xls_file_name = Path(xls_file_name)
+    return xls_file_name.with_name(xls_file_name.name + SIDECAR_SUFFIX)
+
+
+def hash_text(text):
+    """Returns a short hash of a text value"""
+    return hashlib.sha1(str(text).encode("utf-8")).hexdigest()
+
+
+class FingerprintCache:
+    """
+    Fingerprints by sheet and row. A row fingerprint covers the template
+    name, the hash of the template and the values of the cells the template
+    references. The hash of the rendered configuration is kept as well, so a
+    row is only skipped when its Configuration cell still holds that output.
+    """
+
+    def __init__(self, path=None):
+        self.old = {}
+        self.new = {}
+        self.pending = {}
+        self.skipped = 0
+        if path is not None and Path(path).exists():
+            # A sidecar that can not be read is an empty cache, every row is rendered again
+            try:
+                with open(path) as filehandle:
+                    data = json.load(filehandle)
+                if data.get("version") == SIDECAR_VERSION:
+                    self.old = dict(data["sheets"])
+            except (OSError, ValueError, KeyError, TypeError, AttributeError):
+                self.old = {}
+
+
+    def get_template_column(self, sheet, render_plans):
+        """
+        Returns the Template column of a sheet with the rows that have not
+        changed set to None, so they are not rendered.
+        """
+        template_hashes = {name: hash_text(plan.template) for name, plan in render_plans.items()}
+        old_rows = self.old.get(sheet.name, {})
+        new_rows = self.new.setdefault(sheet.name, {})
+        pending = self.pending.setdefault(sheet.name, {})
+        config_column = sheet.get_column("Configuration")
+        template_column = []
+        for row_pos, template_name in enumerate(sheet.get_column("Template")):
+            if not template_name:
+                template_column.append(template_name)
+                continue
+            values = [sheet.get_column(field)[row_pos] or "" for field in render_plans[template_name].fields]
+            fingerprint = hash_text(repr((template_name, template_hashes[template_name], values)))
+            row_key = str(sheet.first_row + row_pos)
+            old = old_rows.get(row_key)
+            if old and old[0] == fingerprint and old[1] == hash_text(config_column[row_pos]):
+                new_rows[row_key] = old
+                template_column.append(None)
+                self.skipped += 1
+            else:
+                pending[row_key] = fingerprint
+                template_column.append(template_name)
+        return template_column
+
+
+    def record(self, sheetname, row, cfg):
+        """Stores the fingerprint of a row that has been rendered"""
+        row_key = str(row)
+        self.new.setdefault(sheetname, {})[row_key] = [self.pending[sheetname][row_key], hash_text(cfg)]
+
+
+    def save(self, path):
+        """Writes the fingerprints of this run to the sidecar file"""
+        with open(path, "w") as filehandle:
+            json.dump({"version": SIDECAR_VERSION, "sheets": self.new}, filehandle)
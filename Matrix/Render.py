@@ -0,0 +1,202 @@
+"""
+Configuration Template Engine
+Compiles the str.format() templates from the Settings sheet once into a
+render plan, then renders whole columns of a sheet with it.
+"""
+import string
+import concurrent.futures
+
+FORMATTER = string.Formatter()
+
+# Render plans of a generation worker process, compiled once per process
+WORKER_PLANS = {}
+# Render plans by (name, template), WorkBooks with the same templates share them
+PLAN_CACHE = {}
+
+
+class RenderPlan:
+    """
+    A template compiled once. 'fields' are the headers it needs and 'parts'
+    the literal segments and field slots, in order, ready to be joined.
+    Fields with a format spec, conversion, attribute or index are rendered
+    through string.Formatter so the output stays the same as str.format().
+    """
+
+    def __init__(self, name, template):
+        self.name = name
+        self.template = template if template is not None else ""
+        # Why the template could not be compiled, see compile_template()
+        self.error = None
+        self.parts = []
+        self.fields = []
+        # A format spec with its own fields, i.e. "{Port:>{Width}}", is left to
+        # str.format() for every row
+        self.nested = False
+        for literal, field, spec, conversion in FORMATTER.parse(self.template):
+            if literal:
+                self.parts.append(literal)
+            if field is None:
+                continue
+            key = field.split(".")[0].split("[")[0]
+            self.__add_field(key)
+            if field == key and not spec and not conversion:
+                self.parts.append(Field(key))
+            else:
+                self.parts.append(Field(key, field, spec, conversion))
+            if spec and "{" in spec:
+                self.nested = True
+                for nested_literal, nested_field, x, y in FORMATTER.parse(spec):
+                    if nested_field:
+                        self.__add_field(nested_field.split(".")[0].split("[")[0])
+
+
+    def __add_field(self, key):
+        """Adds a field to the list of needed fields once"""
+        if key not in self.fields:
+            self.fields.append(key)
+
+
+    def render_rows(self, columns, row_positions):
+        """
+        Renders the rows at 'row_positions' in one pass. 'columns' maps each
+        header to its list of values; empty values are rendered as "".
+        Returns the configurations in the same order as 'row_positions'.
+        """
+        if self.nested:
+            return [self.template.format(**{field: columns[field][pos] or "" for field in self.fields})
+                    for pos in row_positions]
+        slots = []
+        for part in self.parts:
+            if isinstance(part, Field):
+                slots.append((part, columns[part.key]))
+            else:
+                slots.append((part, None))
+        configs = []
+        for pos in row_positions:
+            out = []
+            for part, values in slots:
+                if values is None:
+                    out.append(part)
+                else:
+                    out.append(part.render(values[pos]))
+            configs.append("".join(out))
+        return configs
+
+
+class Field:
+    """A field slot of a RenderPlan"""
+    __slots__ = ("key", "field", "spec", "conversion")
+
+    def __init__(self, key, field=None, spec="", conversion=None):
+        self.key = key
+        self.field = field
+        self.spec = spec
+        self.conversion = conversion
+
+
+    def render(self, value):
+        """Formats a cell value the way str.format() would"""
+        if not value:
+            value = ""
+        if self.field is None:
+            return value if isinstance(value, str) else format(value)
+        value = FORMATTER.get_field(self.field, (), {self.key: value})[0]
+        value = FORMATTER.convert_field(value, self.conversion)
+        return format(value, self.spec)
+
+
+def compile_templates(config_templates):
+    """Returns a dictionary of Template Name to RenderPlan, a template that
+    was compiled before is not compiled again"""
+    render_plans = {}
+    for name, tmplt in config_templates.items():
+        if (name, tmplt) not in PLAN_CACHE:
+            PLAN_CACHE[(name, tmplt)] = compile_template(name, tmplt)
+        render_plans[name] = PLAN_CACHE[(name, tmplt)]
+    return render_plans
+
+
+def compile_template(name, template):
+    """Returns the RenderPlan of a template. A malformed or non-text template
+    gets an empty plan with its error set instead of raising, so it only
+    stops the sheets that use it, see find_template_issues()"""
+    try:
+        if template is not None and not isinstance(template, str):
+            raise TypeError("it is a {} and not text".format(type(template).__name__))
+        return RenderPlan(name, template)
+    except (ValueError, TypeError) as e:
+        plan = RenderPlan(name, None)
+        plan.error = str(e)
+        return plan
+
+
+def render_columns(render_plans, template_column, columns):
+    """
+    Renders every row of a sheet that has a template. 'template_column' is
+    the list of template names and 'columns' maps each header to its list
+    of values. Rows of the same template are rendered together.
+    Returns a list of (row position, configuration).
+    """
+    rows_by_template = {}
+    for row_pos, template_name in enumerate(template_column):
+        if template_name:
+            rows_by_template.setdefault(template_name, []).append(row_pos)
+    rendered = []
+    for template_name, row_positions in rows_by_template.items():
+        configs = render_plans[template_name].render_rows(columns, row_positions)
+        rendered.extend(zip(row_positions, configs))
+    return rendered
+
+
+def render_sheets_parallel(jobs, render_plans, processes):
+    """
+    Renders sheets on a pool of processes. Every job is a plain tuple of
+    (sheet name, headers, rows) with each row as (row position, values in
+    the order of headers), 'headers' must include "Template".
+    Yields (sheet name, [(row position, configuration), ...]) as the sheets
+    are done.
+    """
+    config_templates = {name: plan.template for name, plan in render_plans.items()}
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=max(1, min(processes, len(jobs))),
+            initializer=_init_worker,
+            initargs=(config_templates,)) as executor:
+        for result in executor.map(_render_job, jobs):
+            yield result
+
+
+def _init_worker(config_templates):
+    """Compiles the templates once in each worker process"""
+    WORKER_PLANS.update(compile_templates(config_templates))
+
+
+def _render_job(job):
+    """Renders one sheet job in a worker process"""
+    sheet_name, headers, rows = job
+    positions = [row[0] for row in rows]
+    columns = dict(zip(headers, zip(*[row[1] for row in rows])))
+    rendered = render_columns(WORKER_PLANS, columns["Template"], columns)
+    return sheet_name, [(positions[index], cfg) for index, cfg in rendered]
+
+
+def find_template_issues(sheet_name, headers, render_plans, template_names):
+    """
+    Checks the templates a sheet uses before anything is rendered. Returns a
+    list of messages for unknown or malformed templates and fields with no
+    header.
+    """
+    issues = []
+    for template_name in sorted(set(template_names), key=str):
+        if template_name not in render_plans:
+            issues.append("Sheet '{}' uses the template '{}' which is not defined in the 'Settings' Sheet.".format(
+                sheet_name, template_name))
+            continue
+        if render_plans[template_name].error:
+            issues.append("Sheet '{}' uses the template '{}' which can not be compiled: {}".format(
+                sheet_name, template_name, render_plans[template_name].error))
+            continue
+        missing = [field for field in render_plans[template_name].fields if field not in headers]
+        if missing:
+            issues.append("Sheet '{}' uses the template '{}' which needs the header(s) {} that do not exist.".format(
+                sheet_name, template_name, ", ".join("'{}'".format(field) for field in missing)))
+    return issues
@@ -0,0 +1,192 @@
+"""
+Synthetic Port Matrix Data
+Builds workbooks in the same layout as PortMatrix.xlsx and the matching CDP
+and LLDP output of the devices, used to measure the script.
+"""
+import openpyxl
+
+HEADER_ROW = 9
+BASE_HEADERS = ["Local Interface", "Neighbor Hostname", "Remote Interface",
+                "Connection Status", "Template", "Configuration", "Description"]
+METADATA_LABELS = ["Switch IP", "Username", "Password", "Secret", "Device Type", "Status"]
+METADATA_INFO = ["Version", "Model", "Serial Number", "Boot Image"]
+# One row out of this many has no template
+NO_TEMPLATE_EVERY = 5
+NEIGHBORS_PER_DEVICE = 20
+
+
+def get_sheet_name(sheet_index):
+    """Name of a synthetic device sheet"""
+    return "SW{:04d}".format(sheet_index)
+
+
+def get_host(sheet_index):
+    """Management address of a synthetic device"""
+    return "10.{}.{}.{}".format(sheet_index // 65536 % 256, sheet_index // 256 % 256, sheet_index % 256)
+
+
+def get_local_interface(row_pos):
+    """Local interface of a row, 48 ports per module"""
+    return "GigabitEthernet{}/0/{}".format(1 + row_pos // 48, 1 + row_pos % 48)
+
+
+def get_neighbor(sheet_index, row_pos):
+    """Neighbor host name and remote interface of a row"""
+    neighbor = "NB{:04d}-{:02d}".format(sheet_index, row_pos % NEIGHBORS_PER_DEVICE)
+    return neighbor, "TenGigabitEthernet1/1/{}".format(1 + row_pos // NEIGHBORS_PER_DEVICE)
+
+
+def get_extra_headers(column_count):
+    """Headers after the columns the script uses, up to column_count columns"""
+    return ["Field {}".format(index) for index in range(1, column_count - len(BASE_HEADERS) + 1)]
+
+
+def build_templates(template_count, extra_headers):
+    """Returns a dictionary of template name to a str.format() template"""
+    templates = {}
+    for index in range(template_count):
+        lines = ["interface {Local Interface}", " description {Description}"]
+        for offset in range(min(3, len(extra_headers))):
+            header = extra_headers[(index + offset) % len(extra_headers)]
+            lines.append(" set {} {{{}}}".format(header.lower().replace(" ", "_"), header))
+        templates["template{}".format(index)] = "\n".join(lines)
+    return templates
+
+
+def build_workbook(file_path, sheet_count=10, row_count=500, column_count=12, template_count=4,
+                   device_type="cisco_ios"):
+    """
+    Writes a synthetic Port Matrix workbook: device information in rows 1-8,
+    headers in row 9 and row_count rows per device sheet, plus the Settings
+    sheet with template_count templates. Returns the templates.
+    """
+    column_count = max(column_count, len(BASE_HEADERS))
+    extra_headers = get_extra_headers(column_count)
+    templates = build_templates(template_count, extra_headers)
+    template_names = list(templates.keys())
+    wb_obj = openpyxl.Workbook(write_only=True)
+    for sheet_index in range(sheet_count):
+        ws_obj = wb_obj.create_sheet(get_sheet_name(sheet_index))
+        metadata_values = [get_host(sheet_index), "admin", "password", "secret", device_type, None]
+        for row_pos in range(HEADER_ROW - 1):
+            row = [None] * 4
+            if row_pos < len(METADATA_LABELS):
+                row[0] = METADATA_LABELS[row_pos]
+                row[1] = metadata_values[row_pos]
+            if row_pos < len(METADATA_INFO):
+                row[3] = METADATA_INFO[row_pos]
+            ws_obj.append(row)
+        ws_obj.append(BASE_HEADERS + extra_headers)
+        for row_pos in range(row_count):
+            neighbor, remote_interface = get_neighbor(sheet_index, row_pos)
+            template_name = None
+            if row_pos % NO_TEMPLATE_EVERY:
+                template_name = template_names[row_pos % len(template_names)]
+            row = [get_local_interface(row_pos), neighbor, remote_interface, None, template_name, None,
+                   "Link to {} {}".format(neighbor, remote_interface)]
+            row += ["value {}-{}".format(row_pos, index) for index in range(len(extra_headers))]
+            ws_obj.append(row)
+    settings = wb_obj.create_sheet("Settings")
+    settings.append(["Template Name", "Configuration Template", None, "Sheets to ignore"])
+    for name, template in templates.items():
+        settings.append([name, template])
+    wb_obj.save(file_path)
+    return templates
+
+
+def build_cdp_output(sheet_index, row_count):
+    """Returns 'show cdp neighbors detail' text for a synthetic device"""
+    entries = []
+    for row_pos in range(row_count):
+        neighbor, remote_interface = get_neighbor(sheet_index, row_pos)
+        entries.append(CDP_ENTRY.format(
+            neighbor=neighbor, local_interface=get_local_interface(row_pos),
+            remote_interface=remote_interface, address=get_host(row_pos)))
+    return "".join(entries) + "\n\nTotal cdp entries displayed : {}\n".format(row_count)
+
+
+def build_lldp_output(sheet_index, row_count):
+    """Returns 'show lldp neighbors detail' text for a synthetic device"""
+    entries = []
+    for row_pos in range(row_count):
+        neighbor, remote_interface = get_neighbor(sheet_index, row_pos)
+        local_interface = get_local_interface(row_pos).replace("GigabitEthernet", "Gi")
+        entries.append(LLDP_ENTRY.format(
+            neighbor=neighbor, local_interface=local_interface,
+            remote_interface=remote_interface.replace("TenGigabitEthernet", "Te"),
+            remote_description=remote_interface, address=get_host(row_pos)))
+    return "".join(entries) + "\n\nTotal entries displayed: {}\n".format(row_count)
+
+
+def build_version_output(sheet_index):
+    """Returns 'show version' text for a synthetic cisco_ios device"""
+    return VERSION_OUTPUT.format(hostname=get_sheet_name(sheet_index), serial="FDO{:08d}".format(sheet_index))
+
+
+CDP_ENTRY = """-------------------------
+Device ID: {neighbor}.example.com
+Entry address(es):
+  IP address: {address}
+Platform: cisco WS-C3850-24T,  Capabilities: Switch IGMP
+Interface: {local_interface},  Port ID (outgoing port): {remote_interface}
+Holdtime : 150 sec
+
+Version :
+Cisco IOS Software, IOS-XE Software, Catalyst L3 Switch Software (CAT3K_CAA-UNIVERSALK9-M), Version 03.06.06E RELEASE SOFTWARE (fc1)
+
+advertisement version: 2
+Management address(es):
+  IP address: {address}
+
+"""
+
+LLDP_ENTRY = """------------------------------------------------
+Local Intf: {local_interface}
+Chassis id: 0011.2233.4455
+Port id: {remote_interface}
+Port Description: {remote_description}
+System Name: {neighbor}
+
+System Description:
+Cisco IOS Software
+
+Time remaining: 100 seconds
+System Capabilities: B,R
+Enabled Capabilities: B
+Management Addresses:
+    IP: {address}
+Auto Negotiation - supported, enabled
+Physical media capabilities:
+    1000baseT(FD)
+Media Attachment Unit type: 30
+Vlan ID: - not advertised
+
+"""
+
+VERSION_OUTPUT = """Cisco IOS Software, C3750E Software (C3750E-UNIVERSALK9-M), Version 15.0(2)SE11, RELEASE SOFTWARE (fc3)
+Technical Support: http://www.cisco.com/techsupport
+Copyright (c) 1986-2017 by Cisco Systems, Inc.
+Compiled Sat 19-Aug-17 09:34 by prod_rel_team
+
+ROM: Bootstrap program is C3750E boot loader
+BOOTLDR: C3750E Boot Loader (C3750X-HBOOT-M) Version 15.2(3r)E, RELEASE SOFTWARE (fc1)
+
+{hostname} uptime is 1 year, 2 weeks, 3 days, 4 hours, 5 minutes
+System returned to ROM by power-on
+System image file is "flash:c3750e-universalk9-mz.150-2.SE11.bin"
+
+cisco WS-C3750X-48P (PowerPC405) processor (revision W0) with 262144K bytes of memory.
+Processor board ID {serial}
+Last reset from power-on
+512K bytes of flash-simulated non-volatile configuration memory.
+Base ethernet MAC Address       : 00:11:22:33:44:55
+Model number                    : WS-C3750X-48P-S
+System serial number            : {serial}
+
+Switch Ports Model              SW Version            SW Image
+------ ----- -----              ----------            ----------
+*    1 54    WS-C3750X-48P      15.0(2)SE11           C3750E-UNIVERSALK9-M
+
+
+Configuration register is 0xF
+"""
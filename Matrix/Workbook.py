@@ -0,0 +1,180 @@
+"""
+Port Matrix Workbook Model
+Reads the device sheets row by row with iter_rows(values_only=True), keeping
+only the device information rows, the header row and the columns that are
+needed. Works the same on a workbook opened in full or read-only mode.
+"""
+import openpyxl
+
+# Columns A-C (Local Interface, Neighbor Hostname, Remote Interface) are used
+# by the connection check, the rest are kept only when asked for by header.
+CONNECTION_COLUMNS = (1, 2, 3)
+METADATA_COLUMNS = 4
+
+
+class SheetData:
+    """
+    Values kept from a device sheet. 'metadata' holds the rows above the
+    header row, 'columns' maps a column index to its values starting at
+    the row after the header row.
+    """
+
+    def __init__(self, name, header_row):
+        self.name = name
+        self.header_row = header_row
+        self.first_row = header_row + 1
+        self.max_row = header_row
+        self.metadata = []
+        self.headers = {}
+        self.columns = {}
+
+
+    def get_meta(self, row, column):
+        """Returns the value of a cell above the header row, 1 based"""
+        if row > len(self.metadata) or column > len(self.metadata[row-1]):
+            return None
+        return self.metadata[row-1][column-1]
+
+
+    def get_column(self, header):
+        """Returns the values of a column by its header name"""
+        return self.columns[self.headers[header]]
+
+
+    def get_value(self, column, row):
+        """Returns the value of a kept column at a sheet row number"""
+        return self.columns[column][row - self.first_row]
+
+
+    def get_header_columns(self):
+        """Returns a dictionary of header to values for the kept columns"""
+        return {header: self.columns[col_index] for header, col_index in self.headers.items()
+                if col_index in self.columns}
+
+
+    def get_row_tuples(self, headers, row_positions):
+        """Returns (row position, values) tuples in the order of 'headers'"""
+        columns = [self.get_column(header) for header in headers]
+        return tuple((pos, tuple(column[pos] for column in columns)) for pos in row_positions)
+
+
+    def rows(self):
+        """Returns the range of sheet row numbers after the header row"""
+        return range(self.first_row, self.max_row+1)
+
+
+class ResultWriter:
+    """
+    Output stage, the values to write are queued by sheet and applied to the
+    workbook in one go before saving.
+    """
+
+    def __init__(self):
+        self.writes = {}
+
+
+    def write(self, sheetname, row, column, value):
+        """Queues a value for a cell"""
+        self.writes.setdefault(sheetname, {})[(row, column)] = value
+
+
+    def write_column(self, sheetname, column, row_values):
+        """Queues the values of a column in one step, (row, value) pairs"""
+        cells = self.writes.setdefault(sheetname, {})
+        for row, value in row_values:
+            cells[(row, column)] = value
+
+
+    def get(self, sheetname, row, column):
+        """Returns the value queued for a cell, None if there is none"""
+        return self.writes.get(sheetname, {}).get((row, column))
+
+
+    def items(self):
+        """Returns (sheetname, {(row, column): value}) pairs"""
+        return self.writes.items()
+
+
+    def count(self):
+        """Returns the number of cells queued"""
+        return sum(len(cells) for cells in self.writes.values())
+
+
+    def update(self, results):
+        """Queues every value queued in another ResultWriter"""
+        for sheetname, cells in results.items():
+            self.writes.setdefault(sheetname, {}).update(cells)
+
+
+    def clear(self):
+        """Drops every queued value"""
+        self.writes = {}
+
+
+def save_streamed(input_file, output_file, results):
+    """
+    Saves the input workbook with the results applied, streaming every row
+    from a read-only workbook into a write-only one. Memory stays flat and
+    the workbook is never fully loaded. Values and formulas are kept, but
+    cell formatting, merged cells, column widths and data validation are not.
+    """
+    src_wb = openpyxl.load_workbook(input_file, read_only=True)
+    out_wb = openpyxl.Workbook(write_only=True)
+    writes = dict(results.items())
+    for src_ws in src_wb.worksheets:
+        out_ws = out_wb.create_sheet(src_ws.title)
+        by_row = {}
+        for (row, column), value in writes.get(src_ws.title, {}).items():
+            by_row.setdefault(row, {})[column] = value
+        last_row = 0
+        for row_index, values in enumerate(src_ws.iter_rows(values_only=True), start=1):
+            out_ws.append(merge_row(values, by_row.pop(row_index, None)))
+            last_row = row_index
+        # Results below the last row of the sheet
+        for row_index in sorted(by_row):
+            for empty_row in range(last_row + 1, row_index):
+                out_ws.append([])
+            out_ws.append(merge_row((), by_row[row_index]))
+            last_row = row_index
+    src_wb.close()
+    out_wb.save(output_file)
+
+
+def merge_row(values, row_writes):
+    """Returns the row values with the queued {column: value} writes applied"""
+    if not row_writes:
+        return values
+    values = list(values)
+    values.extend([None] * (max(row_writes) - len(values)))
+    for column, value in row_writes.items():
+        # Same as rw_cell, None leaves the cell as it is
+        if value is not None:
+            values[column-1] = value
+    return values
+
+
+def read_sheet(ws_obj, header_row, keep_headers=None):
+    """
+    Reads a worksheet into a SheetData. Only columns A-C and the columns with
+    a header in 'keep_headers' are kept, all columns if it is None.
+    """
+    sheet = SheetData(ws_obj.title, header_row)
+    keep_index = []
+    for row_index, row in enumerate(ws_obj.iter_rows(values_only=True), start=1):
+        if row_index < header_row:
+            sheet.metadata.append(tuple(row[:METADATA_COLUMNS]))
+        elif row_index == header_row:
+            for col_index, header in enumerate(row, start=1):
+                if isinstance(header, str) and header not in sheet.headers:
+                    sheet.headers[header] = col_index
+            keep_index = [col_index for col_index in range(1, len(row)+1)
+                          if col_index in CONNECTION_COLUMNS
+                          or keep_headers is None
+                          or row[col_index-1] in keep_headers]
+            sheet.columns = {col_index: [] for col_index in keep_index}
+        else:
+            for col_index in keep_index:
+                value = row[col_index-1] if col_index <= len(row) else None
+                sheet.columns[col_index].append(value)
+            sheet.max_row = row_index
+    return sheet
@@ -0,0 +1,195 @@
+"""
+Network Device Collection Engine
+Runs the NetworkDevice collection for several devices at the same time.
+
+A device whose login or collection failed is tried again, up to 'attempts'
+times in all. Each retry waits 'backoff' seconds doubled for every attempt
+made, with jitter, and meanwhile the other devices keep being collected.
+"""
+import time
+import heapq
+import random
+import asyncio
+import concurrent.futures
+
+VERBOSE = False
+
+DEFAULT_WORKERS = 8
+DEFAULT_TIMEOUT = 300
+POLL_INTERVAL = 1
+DEFAULT_ATTEMPTS = 3
+DEFAULT_BACKOFF = 2
+MAX_BACKOFF = 60
+BACKENDS = ["thread", "async"]
+
+
+def collect_devices(net_devices, workers=DEFAULT_WORKERS, timeout=DEFAULT_TIMEOUT,
+                    attempts=DEFAULT_ATTEMPTS, backoff=DEFAULT_BACKOFF):
+    """
+    Runs NetworkDevice.collect() for every device on a pool of up to 'workers'
+    threads. Devices are yielded back to the caller as they finish, so all the
+    work on the WorkBook stays on the calling thread.
+    A device that runs longer than 'timeout' seconds is marked as "Timeout"
+    and yielded right away, the rest of the devices are not held up by it.
+    A failed device is put back at the end of the queue once its backoff is
+    over, it is only yielded when it succeeded or has no attempts left.
+    """
+    if not net_devices:
+        return
+    workers = max(1, min(workers, len(net_devices)))
+    if VERBOSE:
+        print("Collecting", len(net_devices), "devices with", workers, "workers")
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+    started = {}
+    pending = {}
+    # (time the retry is due, order, device), the order keeps the heap off the devices
+    retries = []
+    try:
+        for net_dev in net_devices:
+            future = executor.submit(_run_collect, net_dev, started)
+            pending[future] = net_dev
+        while pending or retries:
+            wait_time = POLL_INTERVAL
+            if retries:
+                wait_time = max(0, min(wait_time, retries[0][0] - time.monotonic()))
+            if pending:
+                done, not_done = concurrent.futures.wait(
+                    pending, timeout=wait_time,
+                    return_when=concurrent.futures.FIRST_COMPLETED
+                )
+            else:
+                time.sleep(wait_time)
+                done, not_done = set(), set()
+            for future in done:
+                net_dev = pending.pop(future)
+                if future.exception():
+                    print("{} | Collection Error. REASON:\n{}".format(net_dev.host, future.exception()))
+                    net_dev.add_cmnt_msg(future.exception(), "Error")
+                    net_dev.status = "Error"
+                delay = get_retry_delay(net_dev, attempts, backoff)
+                if delay is None:
+                    yield net_dev
+                else:
+                    heapq.heappush(retries, (time.monotonic() + delay, id(net_dev), net_dev))
+            now = time.monotonic()
+            while retries and retries[0][0] <= now:
+                net_dev = heapq.heappop(retries)[2]
+                started.pop(net_dev, None)
+                future = executor.submit(_run_collect, net_dev, started)
+                pending[future] = net_dev
+            for future in list(not_done):
+                net_dev = pending[future]
+                # A collection that finished in the meantime can no longer be cancelled
+                if net_dev in started and now - started[net_dev] > timeout and net_dev.cancel():
+                    pending.pop(future)
+                    _mark_timeout(net_dev, timeout)
+                    yield net_dev
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def collect_devices_async(net_devices, workers=DEFAULT_WORKERS, timeout=DEFAULT_TIMEOUT,
+                          attempts=DEFAULT_ATTEMPTS, backoff=DEFAULT_BACKOFF):
+    """
+    asyncio backend for the collection, same interface as collect_devices().
+    'workers' is the global limit of devices being collected at once and
+    'timeout' is the deadline for each host, counted from when it starts.
+    netmiko is blocking, so each collection still runs on an executor thread
+    and a slot is only given back once that thread returns: a host over its
+    deadline is cancelled, marked "Timeout" and yielded, but its slot stays
+    taken until the closed transport unblocks the thread. This way there are
+    never more collections running than workers, and a host does not start
+    its deadline while queued behind a stuck one.
+    A failed host gives its slot back while it waits for its retry.
+    The event loop is stepped from the calling thread, so finished devices
+    are handed back to it while the rest keep running.
+    """
+    if not net_devices:
+        return
+    workers = max(1, min(workers, len(net_devices)))
+    if VERBOSE:
+        print("Collecting", len(net_devices), "devices with asyncio, limit of", workers)
+    loop = asyncio.new_event_loop()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+    try:
+        semaphore = asyncio.Semaphore(workers)
+        pending = set()
+        for net_dev in net_devices:
+            coro = _run_collect_async(net_dev, semaphore, executor, timeout, attempts, backoff)
+            pending.add(loop.create_task(coro))
+        while pending:
+            done, pending = loop.run_until_complete(
+                asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            )
+            for task in done:
+                yield task.result()
+    finally:
+        for task in asyncio.all_tasks(loop):
+            task.cancel()
+        loop.run_until_complete(asyncio.sleep(0))
+        loop.close()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def _run_collect_async(net_dev, semaphore, executor, timeout, attempts, backoff):
+    """Waits for a free slot and then collects the device within its deadline,
+    the backoff before a retry is waited out of the slot"""
+    loop = asyncio.get_running_loop()
+    while True:
+        await semaphore.acquire()
+        future = loop.run_in_executor(executor, net_dev.collect)
+        future.add_done_callback(lambda future: _release_slot(future, semaphore))
+        try:
+            # shield() keeps the executor future, and so the slot, alive past the deadline
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            if net_dev.cancel():
+                _mark_timeout(net_dev, timeout)
+        except Exception as e:
+            print("{} | Collection Error. REASON:\n{}".format(net_dev.host, e))
+            net_dev.add_cmnt_msg(e, "Error")
+            net_dev.status = "Error"
+        delay = get_retry_delay(net_dev, attempts, backoff)
+        if delay is None:
+            return net_dev
+        await asyncio.sleep(delay)
+
+
+def _release_slot(future, semaphore):
+    """Gives the slot back once the executor thread returned, the error of a
+    timed out collection is dropped as nobody waits for it anymore"""
+    semaphore.release()
+    if not future.cancelled():
+        future.exception()
+
+
+def get_retry_delay(net_dev, attempts, backoff):
+    """
+    Returns the seconds to wait before the device is tried again, None if it
+    is done: collected, not worth a retry or out of attempts. The wait is
+    backoff * 2^(attempts made - 1), capped at MAX_BACKOFF, with full jitter
+    on its upper half so devices that failed together do not retry together.
+    """
+    if not net_dev.should_retry() or net_dev.attempts >= attempts:
+        return None
+    delay = min(MAX_BACKOFF, backoff * 2 ** (net_dev.attempts - 1))
+    delay = delay / 2 + random.uniform(0, delay / 2)
+    print("{} | Attempt {} of {} failed, trying again in {:.1f} seconds.".format(
+        net_dev.host, net_dev.attempts, attempts, delay))
+    net_dev.prepare_retry()
+    return delay
+
+
+def _run_collect(net_dev, started):
+    """Worker side of the collection, records the start time for the timeout"""
+    started[net_dev] = time.monotonic()
+    net_dev.collect()
+    return net_dev
+
+
+def _mark_timeout(net_dev, timeout):
+    """Flags a device that went over the per device time limit, its collection
+    has been cancelled so the worker thread can not overwrite this"""
+    print("{} | Collection did not finish within {} seconds, moving on.".format(net_dev.host, timeout))
+    net_dev.add_cmnt_msg("Collection did not finish within {} seconds".format(timeout), "Error")
+    net_dev.status = "Timeout"
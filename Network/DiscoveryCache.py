@@ -0,0 +1,107 @@
+"""
+Discovery Cache
+Keeps the parsed 'show version', CDP and LLDP output of every device on disk,
+so reruns within the time to live do not log in to the devices again.
+"""
+import os
+import re
+import json
+import hashlib
+import time
+import threading
+from pathlib import Path
+
+VERBOSE = False
+
+DEFAULT_CACHE_DIR = Path("discovery_cache")
+DEFAULT_TTL = 3600
+
+
+class DiscoveryCache:
+    """
+    One JSON file per (host, device_type) under cache_dir, named after both
+    with a hash of the exact pair, as the readable part of the name alone
+    could be the same for two devices. Entries older than
+    ttl seconds are ignored, with refresh every entry is ignored and then
+    written again once the device has been collected.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, ttl=DEFAULT_TTL, refresh=False):
+        self.cache_dir = Path(cache_dir)
+        self.ttl = ttl
+        self.refresh = refresh
+
+
+    def get(self, host, device_type):
+        """Returns the cached show output of a device, None if missing, expired
+        or malformed, the device is then collected and its entry written again"""
+        if self.refresh:
+            return None
+        file_path = self.__get_file_path(host, device_type)
+        try:
+            with open(file_path) as filehandle:
+                entry = json.load(filehandle)
+            age = time.time() - float(entry["time"])
+            show_output = entry["show_output"]
+            # The entry of another device must never be loaded
+            if entry["host"] != host or entry["device_type"] != device_type:
+                return None
+        except (OSError, ValueError, TypeError, KeyError):
+            return None
+        if not isinstance(show_output, dict):
+            return None
+        if age > self.ttl:
+            if VERBOSE:
+                print(host, "| Cached discovery data expired {:.0f} seconds ago".format(age - self.ttl))
+            return None
+        return show_output
+
+
+    def store(self, host, device_type, show_output):
+        """Writes the show output of a device, replacing any older entry"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        file_path = self.__get_file_path(host, device_type)
+        entry = {
+            "host": host,
+            "device_type": device_type,
+            "time": time.time(),
+            "show_output": show_output
+        }
+        # Written to a temporary file first so a reader never sees half an entry
+        tmp_path = file_path.with_name("{}.{}.{}.tmp".format(file_path.name, os.getpid(), threading.get_ident()))
+        with open(tmp_path, "w") as filehandle:
+            json.dump(entry, filehandle)
+        os.replace(tmp_path, file_path)
+
+
+    def invalidate(self, host, device_type=None):
+        """Removes the cached entries of a host, for every device type if none is given"""
+        if device_type is not None:
+            # The file name holds the hash of the exact key
+            file_path = self.__get_file_path(host, device_type)
+            file_paths = [file_path] if file_path.exists() else []
+        else:
+            file_paths = []
+            for file_path in self.cache_dir.glob(self.__get_file_path(host, "*").name):
+                # The file name is not enough, "sw1_*" would also match host "sw1_b", an
+                # entry that can not be read is left alone, get() never uses it
+                try:
+                    with open(file_path) as filehandle:
+                        if json.load(filehandle)["host"] == host:
+                            file_paths.append(file_path)
+                except (OSError, ValueError, TypeError, KeyError):
+                    continue
+        for file_path in file_paths:
+            file_path.unlink()
+            if VERBOSE:
+                print(host, "| Removed cached discovery data", file_path.name)
+
+
+    def __get_file_path(self, host, device_type):
+        """Returns the file of a (host, device_type) entry, with the "*" device
+        type the glob of every entry of the host"""
+        name = re.sub(r"[^\w.-]", "_", str(host))
+        if device_type == "*":
+            return self.cache_dir / (name + "_*.json")
+        key_hash = hashlib.sha1(json.dumps([str(host), device_type]).encode("utf-8")).hexdigest()[:12]
+        return self.cache_dir / "{}_{}_{}.json".format(name, re.sub(r"[^\w.-]", "_", str(device_type)), key_hash)
@@ -0,0 +1,53 @@
+"""
+Interface Name Normalizer
+Shortens interface names so the names from the spreadsheet and the names
+reported by CDP/LLDP can be compared. Patterns are compiled once and results
+are cached, the same names come up for every neighbor and every row.
+"""
+import re
+import functools
+
+CACHE_SIZE = 8192
+
+NUMBER_RE = re.compile(r"(\d.*)$")
+NAME_RE = re.compile(r"([a-zA-Z]+)")
+
+# Prefix length by the first 3 letters of the interface, for the device types
+# that do not simply use the first 2 letters.
+LONG_PREFIXES = {
+    "cisco_nxos": {"eth": 3, "vla": 4, "mgm": 4},
+    "cisco_xr": {"eth": 3, "vla": 4, "mgm": 4},
+}
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def get_short_if_name(interface, device_type="cisco_ios"):
+    """
+    Returns short if name. for cisco_ios it returns first 2 char and the
+    interface number. For cisco_nxos and cisco_xr Ethernet keeps 3 char, Vlan
+    and mgmt keep 4, the rest 2. Any other device type follows cisco_ios.
+    """
+    number = NUMBER_RE.search(interface)
+    name = NAME_RE.search(interface)
+    name = name.group(1) if name else ""
+    prefix_len = LONG_PREFIXES.get(device_type, {}).get(left(name, 3).lower(), 2)
+    short_name = left(name, prefix_len)
+    if number:
+        short_name = short_name + number.group(1)
+    return short_name
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def get_if_key(interface, device_type="cisco_ios"):
+    """Lower case short if name, this is what the neighbor index compares"""
+    return get_short_if_name(interface, device_type).lower()
+
+
+def get_host_key(hostname):
+    """Strips the domain from a neighbor hostname"""
+    return hostname.split(".")[0]
+
+
+def left(s, amount):
+    """Returns the left characters of amount size"""
+    return s[:amount]
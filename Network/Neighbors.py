@@ -0,0 +1,54 @@
+"""
+Neighbor Table Index
+Turns the CDP/LLDP neighbor tables into compact records and a dictionary so
+the spreadsheet rows can be verified without scanning every neighbor. Only
+the fields used by the verification and the reports are kept, the strings are
+interned as the same names repeat across neighbors and devices.
+"""
+import sys
+from Network.Interfaces import get_if_key, get_host_key
+
+
+class Neighbor:
+    """One CDP/LLDP neighbor of a device"""
+    __slots__ = ("host", "mod_host", "local_interface", "remote_interface", "local_short_if", "remote_short_if")
+
+    def __init__(self, host, local_interface, remote_interface, device_type="cisco_ios"):
+        self.host = sys.intern(host)
+        self.mod_host = sys.intern(get_host_key(host))
+        self.local_interface = sys.intern(local_interface)
+        self.remote_interface = sys.intern(remote_interface)
+        self.local_short_if = sys.intern(get_if_key(local_interface, device_type))
+        self.remote_short_if = sys.intern(get_if_key(remote_interface, device_type))
+
+
+    def to_dict(self, host_field):
+        """Returns the neighbor in the TextFSM form, as kept in the discovery cache"""
+        return {host_field: self.host, "local_interface": self.local_interface,
+                "remote_interface": self.remote_interface}
+
+
+def build_neighbors(table, host_field, device_type="cisco_ios"):
+    """
+    Returns a list of Neighbor from a parsed CDP/LLDP table, 'host_field' is
+    the key holding the neighbor name.
+    """
+    return [Neighbor(neigh[host_field], neigh["local_interface"], neigh["remote_interface"], device_type)
+            for neigh in table]
+
+
+def build_index(neighbors):
+    """
+    Returns a dictionary keyed by (neighbor host, local short interface), both
+    lower case, with the set of remote short interfaces seen as the value.
+    """
+    index = {}
+    for neigh in neighbors:
+        key = (neigh.mod_host.lower(), neigh.local_short_if)
+        index.setdefault(key, set()).add(neigh.remote_short_if)
+    return index
+
+
+def is_in_index(index, neighbor, local_short_if, remote_short_if):
+    """Checks if the neighbor/local/remote combination exists in the index"""
+    return remote_short_if in index.get((neighbor.lower(), local_short_if), ())
@@ -5,14 +5,55 @@ import sys
 import traceback
 from datetime import datetime
 import time
+import threading
 import netmiko
 import re
 import json
 import os
 from pathlib import Path, PurePosixPath
+import Network.Neighbors as Neighbors
+import Network.Interfaces as Interfaces
+import Network.Parsers as Parsers
+import Network.Trace as Trace
+import Network.SessionLog as SessionLog
 
 VERBOSE = False
 
+# Commands gathered from every device, also the keys of NetworkDevice.get_show_output()
+VERSION_CMD = "show version"
+CDP_CMD = "show cdp neigh detail"
+LLDP_CMD = "show lldp neigh detail"
+GATHER_CMDS = [VERSION_CMD, CDP_CMD, LLDP_CMD]
+# Field holding the neighbor name in the TextFSM tables
+CDP_HOST_FIELD = "destination_host"
+LLDP_HOST_FIELD = "neighbor"
+# Status of a failed collection that is worth another attempt
+RETRY_STATUSES = ["Error", "Connection Error"]
+
+# Connection and read timing by device_type, "default" is used for any value
+# not set for the device_type. With "pipeline" a command batch is written to
+# the device at once and the output is split on the prompt.
+DEVICE_TIMING = {
+    "default": {
+        "global_delay_factor": 2,
+        "fast_cli": False,
+        "conn_timeout": 10,
+        "read_timeout": 30,
+        "pipeline": False
+    },
+    "cisco_ios": {
+        "global_delay_factor": 1,
+        "fast_cli": True,
+        "pipeline": True
+    },
+    "cisco_nxos": {
+        "global_delay_factor": 1,
+        "fast_cli": True,
+        "pipeline": True
+    }
+}
+
+
 class NetworkDevice:
     """
     Network Device Class to be utilized in the Script
@@ -28,27 +69,250 @@ class NetworkDevice:
         self.username = kwargs["username"]
         self.password = kwargs["password"]
         self.device_type = kwargs["device_type"]
+        self.secret = kwargs.get("secret")
         self.sheetname = kwargs["sheetname"]
+        # Every Sheet that points at this device, the first one is sheetname
+        self.sheetnames = [self.sheetname]
+        self.discovery_cache = kwargs.get("discovery_cache")
+        self.replay = kwargs.get("replay")
+        # With a SessionPool the SSH session is kept open after the collection
+        self.session_pool = kwargs.get("session_pool")
+        # With a SessionLogWriter the raw session output is written to raw_logs/
+        self.session_log = kwargs.get("session_log")
+        self.port = kwargs.get("port") or 22
         self.cmnt_msgs = []
         self.status = "Connection Not Started"
         self.connection = None
+        # Logins tried, a rejected login is not tried again
+        self.attempts = 0
+        self.auth_failed = False
         self.model = ""
         self.boot_image = ""
         self.version = ""
         self.serial_number = ""
         self.cdp_neighbors = []
         self.lldp_neighbors = []
+        self.cdp_index = {}
+        self.lldp_index = {}
+        self.unmatched_rows = {}
+        self.show_output = {}
         self.connection = None
+        # Copy of the device the running collection works on, see collect()
+        self.worker = None
+        self.state_lock = threading.Lock()
+
+#######################################################
+    def collect(self):
+        """
+        Gathers the device data with run_collection() on a worker copy of the
+        device. The results are only copied back if the collection was not
+        cancelled in the meantime, a timed out collection that carries on in
+        its thread can not change the device any more. Every call is counted
+        as an attempt, whether or not it got as far as the login.
+        """
+        self.attempts += 1
+        worker = self.start_worker()
+        worker.run_collection()
+        self.commit_collection(worker)
 
+
+    def run_collection(self):
+        """
+        Connects to the device and gathers the 'show version', CDP and LLDP
+        information. Status is left as "Data Gathered" when successful.
+        If the discovery cache has fresh data for the device, or a replay
+        source of captured output is set, no connection is opened.
+        """
+        if self.replay is not None:
+            self.load_from_replay()
+            return
+        if self.load_from_cache():
+            return
         self.start_connection()
         if self.is_connection_alive():
-            self.__get_cdp_neigh()
-            self.__get_lldp_neigh()
+            try:
+                self.gather_show_output()
+            except Exception as e:
+                print("{} | Error while gathering neighbor information. REASON:\n{}".format(self.host, e))
+                self.add_detected_error(e)
+                self.status = "Error"
             self.end_connection()
-        else:
+            self.store_to_cache()
+        elif self.status != "Error":
             self.status = "Connection Error"
 
-#######################################################
+
+    def start_worker(self):
+        """Returns a new copy of the device to run a collection on"""
+        worker = NetworkDevice(host=self.host, username=self.username, password=self.password,
+                               device_type=self.device_type, secret=self.secret, sheetname=self.sheetname,
+                               discovery_cache=self.discovery_cache, replay=self.replay,
+                               session_pool=self.session_pool, session_log=self.session_log, port=self.port)
+        worker.cmnt_msgs = list(self.cmnt_msgs)
+        worker.attempts = self.attempts
+        worker.auth_failed = self.auth_failed
+        with self.state_lock:
+            self.worker = worker
+        return worker
+
+
+    def commit_collection(self, worker):
+        """Takes the results of a worker, returns False if it was cancelled"""
+        with self.state_lock:
+            if self.worker is not worker:
+                return False
+            self.worker = None
+            self.copy_collection(worker)
+        return True
+
+
+    def cancel(self):
+        """Drops the running collection: its results are not taken and its
+        transport is closed. Returns False if no collection is running."""
+        with self.state_lock:
+            worker, self.worker = self.worker, None
+        if worker is None:
+            return False
+        worker.abort_connection()
+        return True
+
+
+    def copy_collection(self, net_dev):
+        """
+        Takes the gathered data and status of another NetworkDevice for the
+        same device, so a device shared by several WorkBooks is collected once.
+        """
+        self.status = net_dev.status
+        self.hostname = net_dev.hostname
+        self.model = net_dev.model
+        self.boot_image = net_dev.boot_image
+        self.version = net_dev.version
+        self.serial_number = net_dev.serial_number
+        self.cdp_neighbors = net_dev.cdp_neighbors
+        self.lldp_neighbors = net_dev.lldp_neighbors
+        self.cdp_index = net_dev.cdp_index
+        self.lldp_index = net_dev.lldp_index
+        self.show_output = net_dev.show_output
+        self.cmnt_msgs = list(net_dev.cmnt_msgs)
+        self.attempts = net_dev.attempts
+        self.auth_failed = net_dev.auth_failed
+
+
+    def should_retry(self):
+        """Returns True if the collection failed in a way another attempt may
+        fix, captured output or a rejected login is the same the next time"""
+        return self.status in RETRY_STATUSES and not self.auth_failed and self.replay is None
+
+
+    def prepare_retry(self):
+        """Drops the session of the failed attempt, the errors are kept in the
+        comment messages"""
+        self.abort_connection()
+        self.connection = None
+        self.status = "Retry Pending"
+
+
+    def needs_connection(self):
+        """Returns True if collect() will have to log in to the device"""
+        if self.replay is not None:
+            return False
+        if self.discovery_cache is None or self.discovery_cache.refresh:
+            return True
+        return self.discovery_cache.get(self.host, self.device_type) is None
+
+
+    def load_from_cache(self):
+        """Loads the device data from the discovery cache, returns True if it was fresh"""
+        if self.discovery_cache is None:
+            return False
+        with Trace.span("cache_lookup", self.host):
+            show_output = self.discovery_cache.get(self.host, self.device_type)
+        if show_output is None:
+            return False
+        try:
+            self.load_show_output(show_output)
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            # A malformed entry is a miss, the device is collected and cached again
+            if VERBOSE:
+                print("{} | Ignoring malformed cached discovery data: {!r}".format(self.host, e))
+            return False
+        if VERBOSE:
+            print(self.host, "| Using cached discovery data")
+        self.status = "Data Gathered"
+        return True
+
+
+    def load_from_replay(self):
+        """Parses the captured output of the device instead of connecting to it"""
+        if VERBOSE:
+            print(self.host, "| Parsing captured output")
+        try:
+            with Trace.span("replay", self.host):
+                self.load_show_output(self.replay.get(self.host, self.device_type, GATHER_CMDS))
+            self.status = "Data Gathered"
+        except Exception as e:
+            print("{} | Unable to use the captured output. REASON:\n{}".format(self.host, e))
+            self.add_detected_error(e)
+            self.status = "Error"
+
+
+    def store_to_cache(self):
+        """Stores the gathered data in the discovery cache"""
+        if self.discovery_cache is not None and self.status == "Data Gathered":
+            try:
+                self.discovery_cache.store(self.host, self.device_type, self.get_show_output())
+            except OSError as e:
+                # The data was gathered, only the next run has to collect it again
+                print("{} | Unable to write the discovery cache. REASON:\n{}".format(self.host, e))
+
+
+    def get_show_output(self):
+        """
+        Returns the gathered data keyed by command, in the TextFSM form that
+        load_show_output() takes. Only the kept neighbor fields are included.
+        """
+        return {
+            VERSION_CMD: self.show_output[VERSION_CMD],
+            CDP_CMD: [neigh.to_dict(CDP_HOST_FIELD) for neigh in self.cdp_neighbors],
+            LLDP_CMD: [neigh.to_dict(LLDP_HOST_FIELD) for neigh in self.lldp_neighbors]
+        }
+
+
+    def load_show_output(self, show_output):
+        """
+        Fills in the device information and neighbors from the parsed output of
+        the 'show version', CDP and LLDP commands, keyed by command.
+        """
+        self.load_version_info(show_output[VERSION_CMD])
+        self.load_cdp_neighbors(show_output[CDP_CMD])
+        self.load_lldp_neighbors(show_output[LLDP_CMD])
+
+
+    def gather_show_output(self):
+        """
+        Sends 'term len 0' and the 'show version', CDP and LLDP commands as one
+        batch, then parses and loads all of the output.
+        """
+        if VERBOSE:
+            print(self.host, "| Gathering show version, CDP and LLDP neighbors")
+        outputs = self.send_command_batch(["term len 0"] + GATHER_CMDS)
+        self.load_show_output({cmd: outputs[cmd] for cmd in GATHER_CMDS})
+        if VERBOSE:
+            print("{} | Data gathered, hostname is: {}".format(self.host, self.hostname))
+
+
+    def abort_connection(self):
+        """
+        Closes the underlying transport without waiting on the device, used to
+        unblock a collection that has gone over its time limit.
+        """
+        if self.connection:
+            try:
+                self.connection.remote_conn.close()
+            except Exception:
+                pass
+
+
     def send_reload_in(self, reload_time=10):
         """Sends command reload in 20 (20 by default)"""
         if VERBOSE:
@@ -97,9 +361,9 @@ class NetworkDevice:
                 time.sleep(wait_time)
                 self.start_connection_log()
                 self.connection.establish_connection()
-                if net_dev.is_connection_alive():
+                if self.is_connection_alive():
                     return
-            if not net_dev.is_connection_alive():
+            if not self.is_connection_alive():
                 msg = "Issue with reestablishing connection to the device. Please attempt to access the device and correct issues or wait for the time reload."
                 self.add_cmnt_msg(msg.format("UPLINK"), "Error")
 
@@ -107,33 +371,62 @@ class NetworkDevice:
     def start_connection(self):
         """
         Attempts to Connect to Device.
-        ConnectionHandler variable. Will also submit "term len 0 " command.
+        ConnectionHandler variable. Timing settings are taken from DEVICE_TIMING
+        for the device_type.
         """
         try:
             if VERBOSE:
                 print("{} | Starting Connection ".format( self.host))
-            self.connection = netmiko.ConnectHandler(
-                device_type=self.device_type+"_ssh",
-                host=self.host,
-                username=self.username,
-                password = self.password,
-                global_delay_factor=2
-            )
+            timing = get_timing(self.device_type)
+            with Trace.span("connect", self.host, attempt=self.attempts):
+                if self.session_pool is not None:
+                    self.connection = self.session_pool.acquire(self.get_session_key(),
+                                                                lambda: self.__connect(timing))
+                else:
+                    self.connection = self.__connect(timing)
             #self.start_connection_log()
-            self.connection.enable()
-            self.connection.send_command("term len 0")
-            self.update_dev_info()
+            with Trace.span("enable", self.host):
+                self.connection.enable()
             self.status="Active"
             if VERBOSE:
-                print("{} | Connection established, hostname is: {}".format(self.host, self.hostname))
+                print("{} | Connection established".format(self.host))
         except Exception as e:
             print("{} | Connection Error with host, unable to connect. REASON:\n{}".format(self.host, e))
             self.add_detected_error(e)
+            self.auth_failed = isinstance(e, netmiko.NetmikoAuthenticationException)
             self.status = "Error"
 
 
+    def __connect(self, timing):
+        """Opens a new SSH session to the device"""
+        return netmiko.ConnectHandler(
+            device_type=self.device_type+"_ssh",
+            host=self.host,
+            port=self.port,
+            username=self.username,
+            password = self.password,
+            secret=self.secret or "",
+            global_delay_factor=timing["global_delay_factor"],
+            fast_cli=timing["fast_cli"],
+            conn_timeout=timing["conn_timeout"],
+            session_log=self.session_log.open_log(self.host) if self.session_log else None
+        )
+
+
+    def get_session_key(self):
+        """Sessions are shared in the SessionPool by device and credentials"""
+        return (self.host, self.port, self.device_type, self.username, self.password, self.secret)
+
+
     def update_dev_info(self):
-        vers_info = self.send_command("show version")[0]
+        """Gathers the 'show version' information"""
+        self.load_version_info(self.send_command(VERSION_CMD))
+
+
+    def load_version_info(self, vers_output):
+        """Updates the device information from the parsed 'show version'"""
+        self.show_output[VERSION_CMD] = vers_output
+        vers_info = vers_output[0]
         self.hostname = vers_info["hostname"]
         if self.device_type=="cisco_ios":
             self.boot_image = vers_info["running_image"]
@@ -148,30 +441,94 @@ class NetworkDevice:
 
 
     def start_connection_log(self):
-        """Starts logging in Append Mode"""
-        log_path = Path("raw_logs/"+(self.host+"_raw_cli.log"))
-        self.__add_time_stamp_to_file(log_path)
-        self.connection.open_session_log(str(log_path), "append")
+        """Starts logging the open session through the SessionLogWriter,
+        one to raw_logs/ is started if the device has none"""
+        if self.session_log is None:
+            self.session_log = SessionLog.get_default_writer()
+        self.connection.session_log = netmiko.session_log.SessionLog(
+            buffered_io=self.session_log.open_log(self.host),
+            no_log={name: value for name, value in (("password", self.password), ("secret", self.secret)) if value}
+        )
         if VERBOSE:
             print(self.host,"| Session Logging has been enabled")
 
 
     def send_command(self, command_string, use_textfsm=True):
         """
-        sends_command via the connection and returns the output, if a template is
-        specified then it uses textfsm with that particular template
+        sends_command via the connection and returns the output, with use_textfsm
+        the output is parsed with the template registry for the device_type
         """
-        return self.connection.send_command(command_string, use_textfsm=use_textfsm)
+        with Trace.span("send_command", self.host, command=command_string) as trace_args:
+            output = self.connection.send_command(command_string)
+            trace_args["bytes"] = len(output)
+        Trace.count("bytes received", len(output))
+        if use_textfsm:
+            return self.parse_output(command_string, output)
+        return output
+
+
+    def parse_output(self, command_string, output):
+        """Parses the output of a command with the template registry"""
+        with Trace.span("parse", self.host, command=command_string):
+            return Parsers.parse_output(self.device_type, command_string, output)
+
+
+    def send_command_batch(self, commands, use_textfsm=True):
+        """
+        Sends a list of commands in the one session, the end of each output is
+        detected by the prompt. Returns the output keyed by command, parsed
+        once all commands are done if use_textfsm.
+        With the "pipeline" timing setting the commands are written at once,
+        any output that can not be split on the prompt is sent again alone.
+        """
+        timing = get_timing(self.device_type)
+        outputs = {}
+        if timing["pipeline"]:
+            with Trace.span("send_batch", self.host, commands=len(commands)) as trace_args:
+                outputs = self.__send_pipelined(commands, timing["read_timeout"])
+                trace_args["bytes"] = sum(len(output) for output in outputs.values())
+        for cmd in commands:
+            if cmd not in outputs:
+                with Trace.span("send_command", self.host, command=cmd) as trace_args:
+                    outputs[cmd] = self.connection.send_command(cmd, read_timeout=timing["read_timeout"])
+                    trace_args["bytes"] = len(outputs[cmd])
+        Trace.count("bytes received", sum(len(outputs[cmd]) for cmd in commands))
+        if use_textfsm:
+            for cmd in commands:
+                outputs[cmd] = self.parse_output(cmd, outputs[cmd])
+        return outputs
+
+
+    def __send_pipelined(self, commands, read_timeout):
+        """Writes all commands at once and reads until a prompt follows each one"""
+        prompt = self.connection.find_prompt()
+        self.connection.write_channel("".join(cmd + self.connection.RETURN for cmd in commands))
+        pattern = "(?:.*?{}){{{}}}".format(re.escape(prompt), len(commands))
+        try:
+            raw_output = self.connection.read_until_pattern(pattern=pattern, re_flags=re.DOTALL,
+                                                            read_timeout=read_timeout)
+        except netmiko.exceptions.ReadTimeout:
+            if VERBOSE:
+                print(self.host, "| Pipelined commands timed out, sending them one at a time")
+            self.connection.clear_buffer()
+            return {}
+        return split_batch_output(raw_output, prompt, commands)
 
 
     def end_connection(self):
-        """Ends Connection if it is alive"""
+        """Ends Connection if it is alive. With a SessionPool the session is
+        given back to the pool instead, unless the collection failed."""
         if self.connection:
             if self.is_connection_alive():
-                self.connection.disconnect()
+                if self.session_pool is None:
+                    self.connection.disconnect()
+                elif self.status == "Error":
+                    self.session_pool.discard(self.get_session_key(), self.connection)
+                else:
+                    self.session_pool.release(self.get_session_key(), self.connection)
                 self.collection_time = datetime.now().strftime("%Y-%m-%d_%Hh%Mm%Ss")
                 if self.status == "Active":
-                    self.status = "Complete"
+                    self.status = "Data Gathered"
                 if VERBOSE:
                     print("{} | Ending Connection".format( str(self.host)))
 
@@ -182,23 +539,6 @@ class NetworkDevice:
             print(self.host, "| Saving running configuration to startup config with 'wr mem' command")
         self.connection.save_config()
 ###############################################################################
-    def __add_time_stamp_to_file(self, file_path):
-        """Adds a timestamp as an append to a file"""
-        f = open(file_path, "a+")
-        f.write("\n"+"#"*80+"\n")
-        f.write(" "*30+self.__time_stamp(":")+" "*30)
-        f.write("\n"+"#"*80+"\n")
-        f.close()
-
-
-    def __time_stamp(self, out_type="L"):
-        """return the current time"""
-        if out_type=="L":
-            return datetime.now().strftime("%Y-%m-%d_%Hh%Mm%Ss")
-        elif out_type==":":
-            return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-
     def get_vers_info(self):
         """
         Reads the "show version" information and updates the NetworkDevice
@@ -215,44 +555,41 @@ class NetworkDevice:
 
 
     def verify_cdp_neigh(self, **kwargs):
-        matching_neighbors = self.find_neighbor(kwargs["neighbor"], "cdp")
-        for intf in matching_neighbors:
-            if intf["local_short_if"] == get_short_if_name(kwargs["local_interface"]).lower():
-                if intf["remote_short_if"] == get_short_if_name(kwargs["remote_interface"]).lower():
-                    return "Verified via CDP"
+        """Checks the row against the CDP neighbor index"""
+        if self.__is_neigh_in_index(self.cdp_index, **kwargs):
+            return "Verified via CDP"
         return None
 
 
     def verify_lldp_neigh(self, **kwargs):
-        matching_neighbors = self.find_neighbor(kwargs["neighbor"], "lldp")
-        for intf in matching_neighbors:
-            if intf["local_short_if"] == get_short_if_name(kwargs["local_interface"]).lower():
-                if intf["remote_short_if"] == get_short_if_name(kwargs["remote_interface"]).lower():
-                    return "Verified via LLDP"
+        """Checks the row against the LLDP neighbor index"""
+        if self.__is_neigh_in_index(self.lldp_index, **kwargs):
+            return "Verified via LLDP"
         return None
 
 
-    def __get_cdp_neigh(self):
-        """Gets the CDP Neighbors"""
-        if VERBOSE:
-            print(self.host, "| Getting CDP neighbors")
-        self.cdp_neighbors = self.send_command("show cdp neigh detail")
-        for neigh in self.cdp_neighbors:
-            neigh["mod_host"]=neigh["destination_host"].split(".")[0]
-            neigh["remote_short_if"] = get_short_if_name(neigh["remote_interface"]).lower()
-            neigh["local_short_if"] = get_short_if_name(neigh["local_interface"]).lower()
+    def __is_neigh_in_index(self, index, **kwargs):
+        """Looks up the neighbor, local and remote interface of a row in an index"""
+        return Neighbors.is_in_index(
+            index,
+            kwargs["neighbor"],
+            Interfaces.get_if_key(kwargs["local_interface"], self.device_type),
+            Interfaces.get_if_key(kwargs["remote_interface"], self.device_type)
+        )
 
 
-    def __get_lldp_neigh(self):
-        """Gets the LLDP Neighbors"""
-        if VERBOSE:
-            print(self.host, "| Getting LLDP neighbors")
-        self.lldp_neighbors = self.send_command("show lldp neigh detail")
-        for neigh in self.lldp_neighbors:
-            neigh["mod_host"]=neigh["neighbor"].split(".")[0]
-            neigh["remote_short_if"] = get_short_if_name(neigh["remote_interface"]).lower()
-            neigh["local_short_if"] = get_short_if_name(neigh["local_interface"]).lower()
+    def load_cdp_neighbors(self, neighbors):
+        """Sets the CDP Neighbors from the parsed output and indexes them"""
+        self.cdp_neighbors = Neighbors.build_neighbors(neighbors, CDP_HOST_FIELD, self.device_type)
+        self.cdp_index = Neighbors.build_index(self.cdp_neighbors)
+        Trace.count("neighbors parsed", len(self.cdp_neighbors))
+
 
+    def load_lldp_neighbors(self, neighbors):
+        """Sets the LLDP Neighbors from the parsed output and indexes them"""
+        self.lldp_neighbors = Neighbors.build_neighbors(neighbors, LLDP_HOST_FIELD, self.device_type)
+        self.lldp_index = Neighbors.build_index(self.lldp_neighbors)
+        Trace.count("neighbors parsed", len(self.lldp_neighbors))
 
 
     def add_cmnt_msg(self, msg, type):
@@ -288,9 +625,9 @@ class NetworkDevice:
     def find_neighbor(self,neigh_name, cdp_lldp):
         """Looks for all CDP Neighbors that match the destination host name"""
         if cdp_lldp=="cdp":
-            return list(filter(lambda net_dev_neigh: net_dev_neigh["mod_host"].lower() == neigh_name.lower(), self.cdp_neighbors))
+            return list(filter(lambda net_dev_neigh: net_dev_neigh.mod_host.lower() == neigh_name.lower(), self.cdp_neighbors))
         elif cdp_lldp=="lldp":
-            return list(filter(lambda net_dev_neigh: net_dev_neigh["mod_host"].lower() == neigh_name.lower(), self.lldp_neighbors))
+            return list(filter(lambda net_dev_neigh: net_dev_neigh.mod_host.lower() == neigh_name.lower(), self.lldp_neighbors))
 
 
     def is_supported(self):
@@ -332,33 +669,34 @@ class NetworkDevice:
             filehandle.write(run_config)
 
 
-def get_short_if_name(interface, device_type = "cisco_ios"):
+def get_timing(device_type):
+    """Returns the timing settings of a device_type, filled in from the defaults"""
+    timing = dict(DEVICE_TIMING["default"])
+    timing.update(DEVICE_TIMING.get(device_type, {}))
+    return timing
+
+
+def load_timing_settings(file_path):
     """
-    Returns short if name. for cisco_ios it returns first 2 char and the
-    interface number. Everything else it returns the first 3 plus number.
+    Updates DEVICE_TIMING from a JSON file of device_type to settings, i.e.:
+    {"cisco_ios": {"read_timeout": 60, "pipeline": false}}
     """
-    number = re.compile(r"(\d.*)$")
-    name = re.compile("([a-zA-Z]+)")
-    number = number.search(interface).group(1)
-    name = name.search(interface).group(1)
-    short_name = ""
-    if device_type == "cisco_ios":
-        short_name = left(name, 2)
-    elif device_type in ["cisco_nxos", "cisco_xr"]:
-        port = left(name, 3).lower()
-        if port == "eth":
-            short_name = left(name, 3)
-        elif port == "vla":
-            short_name = left(name, 4)
-        elif port == "mgm":
-            short_name = left(name, 4)
-        else:
-            short_name = left(name, 2)
-    if int(left(number, 1)) >= 0 or number is None:
-        short_name = short_name + str(number)
-    return short_name
+    with open(file_path) as filehandle:
+        for device_type, settings in json.load(filehandle).items():
+            DEVICE_TIMING.setdefault(device_type, {}).update(settings)
 
 
-def left(s, amount):
-    """Returns the left characters of amount size"""
-    return s[:amount]
+def split_batch_output(raw_output, prompt, commands):
+    """
+    Splits the output of pipelined commands on the prompt. Each part starts
+    with the echo of its command, parts that do not match the command they
+    should belong to are left out.
+    """
+    outputs = {}
+    parts = raw_output.replace("\r\n", "\n").split(prompt)
+    # The text before the first prompt is the echo and output of the first command
+    for cmd, part in zip(commands, parts):
+        echo, newline, output = part.lstrip("\n").partition("\n")
+        if echo.strip() == cmd:
+            outputs[cmd] = output.rstrip()
+    return outputs
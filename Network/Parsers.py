@@ -0,0 +1,116 @@
+"""
+TextFSM Template Registry
+Process wide registry of the ntc-templates. The index is read once, the
+template for a (platform, command) is looked up and compiled on first use and
+the compiled template is reused for every device after that.
+Output is the same as netmiko's send_command(use_textfsm=True).
+"""
+import os
+import threading
+from pathlib import Path
+import textfsm
+from textfsm import clitable
+
+VERBOSE = False
+
+DEFAULT_TEMPLATE_DIR = Path(__file__).parent/"ntc-templates"/"templates"
+
+REGISTRY = None
+REGISTRY_LOCK = threading.Lock()
+
+
+class TemplateRegistry:
+    """Index of the templates and the compiled templates, by template file"""
+
+    def __init__(self, template_dir=None):
+        self.template_dir = Path(template_dir or os.environ.get("NET_TEXTFSM") or DEFAULT_TEMPLATE_DIR)
+        # CliTable parses the index and expands the "sh[[ow]]" completions
+        self.index = clitable.CliTable("index", str(self.template_dir)).index
+        self.lookups = {}
+        self.templates = {}
+        self.lock = threading.Lock()
+
+
+    def get_template_names(self, platform, command):
+        """Returns the template file names for a platform and command, None if there is none"""
+        key = (platform, command)
+        if key not in self.lookups:
+            row_idx = self.index.GetRowMatch({"Command": command, "Platform": platform})
+            self.lookups[key] = self.index.index[row_idx]["Template"].split(":") if row_idx else None
+        return self.lookups[key]
+
+
+    def get_template(self, template_name):
+        """Returns the compiled template and its lock, compiling it on first use"""
+        with self.lock:
+            if template_name not in self.templates:
+                if VERBOSE:
+                    print("Compiling TextFSM template", template_name)
+                with open(self.template_dir/template_name) as template_file:
+                    self.templates[template_name] = (textfsm.TextFSM(template_file), threading.Lock())
+            return self.templates[template_name]
+
+
+    def parse(self, platform, command, raw_output):
+        """
+        Parses the output of a command into a list of dictionaries with lower
+        case keys. The raw output is returned if there is no template or
+        nothing was parsed, the same as netmiko.
+        """
+        template_names = self.get_template_names(platform, command)
+        # Same retry as netmiko, cisco_xe falls back to the cisco_ios templates
+        if template_names is None and platform and "cisco_xe" in platform:
+            template_names = self.get_template_names("cisco_ios", command)
+        if template_names is None:
+            return raw_output
+        if len(template_names) > 1:
+            # Tables of several templates are merged by key, left to CliTable
+            return self.__parse_with_clitable(platform, command, raw_output)
+        fsm, fsm_lock = self.get_template(template_names[0])
+        with fsm_lock:
+            fsm.Reset()
+            records = fsm.ParseText(raw_output)
+            header = [name.lower() for name in fsm.header]
+        structured_data = [dict(zip(header, record)) for record in records]
+        if not structured_data:
+            return raw_output
+        return structured_data
+
+
+    def warm_up(self, platforms, commands):
+        """Compiles the templates of the platforms and commands ahead of time"""
+        count = 0
+        for platform in platforms:
+            for command in commands:
+                for template_name in self.get_template_names(platform, command) or []:
+                    self.get_template(template_name)
+                    count += 1
+        if VERBOSE:
+            print("Preloaded", count, "TextFSM templates")
+        return count
+
+
+    def __parse_with_clitable(self, platform, command, raw_output):
+        """Parses with a fresh CliTable, used for multi template entries"""
+        cli_table = clitable.CliTable("index", str(self.template_dir))
+        try:
+            cli_table.ParseCmd(raw_output, {"Command": command, "Platform": platform})
+        except clitable.CliTableError:
+            return raw_output
+        header = [name.lower() for name in cli_table.header]
+        structured_data = [dict(zip(header, row)) for row in cli_table]
+        return structured_data or raw_output
+
+
+def get_registry():
+    """Returns the process wide TemplateRegistry, created on first use"""
+    global REGISTRY
+    with REGISTRY_LOCK:
+        if REGISTRY is None:
+            REGISTRY = TemplateRegistry()
+        return REGISTRY
+
+
+def parse_output(platform, command, raw_output):
+    """Parses the output of a command with the process wide registry"""
+    return get_registry().parse(platform, command, raw_output)
@@ -0,0 +1,59 @@
+"""
+Reachability Pre-Probe
+Checks the SSH port of every host at the same time with a short timeout, so
+devices that are down are known before any login is attempted.
+"""
+import asyncio
+
+VERBOSE = False
+
+SSH_PORT = 22
+DEFAULT_TIMEOUT = 2
+DEFAULT_LIMIT = 256
+
+
+def probe_hosts(hosts, port=SSH_PORT, timeout=DEFAULT_TIMEOUT, limit=DEFAULT_LIMIT):
+    """
+    Opens a TCP connection to the port of every host, up to 'limit' at once.
+    Returns a dictionary of host to True if the port accepted the connection.
+    """
+    reachable = probe_targets([(host, port) for host in hosts], timeout, limit)
+    return {host: reachable[(host, port)] for host, port in reachable}
+
+
+def probe_targets(targets, timeout=DEFAULT_TIMEOUT, limit=DEFAULT_LIMIT):
+    """
+    Same as probe_hosts() for (host, port) targets, so every device is probed
+    on its own SSH port. Returns a dictionary of (host, port) to True if the
+    port accepted the connection.
+    """
+    targets = list(dict.fromkeys(targets))
+    if not targets:
+        return {}
+    results = asyncio.run(_probe_all(targets, timeout, limit))
+    if VERBOSE:
+        print("Probed", len(targets), "hosts -", sum(results.values()), "reachable,",
+              len(targets) - sum(results.values()), "unreachable")
+    return results
+
+
+async def _probe_all(targets, timeout, limit):
+    """Probes all targets, at most 'limit' connections being opened at once"""
+    semaphore = asyncio.Semaphore(limit)
+    reachable = await asyncio.gather(*[_probe(host, port, timeout, semaphore) for host, port in targets])
+    return dict(zip(targets, reachable))
+
+
+async def _probe(host, port, timeout, semaphore):
+    """Returns True if a TCP connection to host:port opens within the timeout"""
+    async with semaphore:
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(str(host), port), timeout)
+        except (OSError, asyncio.TimeoutError):
+            return False
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        return True
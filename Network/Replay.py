@@ -0,0 +1,82 @@
+"""
+Offline Replay
+Reads captured CLI output from a directory instead of a live session and
+parses it with the TextFSM template registry, the same as a live session.
+
+For every host either of these is read, in this order:
+    <capture_dir>/<host>/<command>.txt      i.e. 10.1.1.1/show_version.txt
+    <capture_dir>/<host>_raw_cli.log        the NetworkDevice raw session log
+
+The rotated session logs, <host>_raw_cli.log.1 or .1.gz and older, are read
+when the command is not in the current log.
+"""
+import re
+from pathlib import Path
+import Network.Parsers as Parsers
+import Network.SessionLog as SessionLog
+
+VERBOSE = False
+
+# A prompt line of a session log, i.e. "SW1#show version" or "SW1>"
+PROMPT_RE = re.compile(r"^[\w.\-:/()@]+[#>]\s*(.*?)\s*$")
+
+
+class ReplaySource:
+    """Captured output of the devices, read from capture_dir"""
+
+    def __init__(self, capture_dir):
+        self.capture_dir = Path(capture_dir)
+
+
+    def get_raw_output(self, host, command):
+        """Returns the captured text of a command, None if it was not captured"""
+        cmd_file = self.capture_dir / str(host) / (command.replace(" ", "_") + ".txt")
+        if cmd_file.exists():
+            return cmd_file.read_text(errors="replace")
+        for raw_log in SessionLog.get_log_files(self.capture_dir, host):
+            output = split_session_log(SessionLog.read_log(raw_log), command)
+            if output is not None:
+                return output
+        return None
+
+
+    def get(self, host, device_type, commands):
+        """
+        Returns the parsed output of the commands keyed by command. Raises a
+        LookupError if a command was not captured and a ValueError if it
+        could not be parsed with a template.
+        """
+        show_output = {}
+        for command in commands:
+            raw_output = self.get_raw_output(host, command)
+            if raw_output is None:
+                raise LookupError("No captured output for '{}' in {}".format(command, self.capture_dir))
+            parsed = Parsers.parse_output(device_type, command, raw_output)
+            if isinstance(parsed, str):
+                raise ValueError("Unable to parse the captured output of '{}' for {}".format(command, device_type))
+            show_output[command] = parsed
+            if VERBOSE:
+                print(host, "| Parsed", len(parsed), "entries from the captured", command)
+        return show_output
+
+
+def split_session_log(log_text, command):
+    """
+    Returns the output of the last time the command was sent in a session
+    log, that is the lines between its prompt line and the next prompt.
+    """
+    output = None
+    lines = None
+    for line in log_text.splitlines():
+        match = PROMPT_RE.match(line)
+        if match:
+            if lines is not None:
+                output = lines
+            lines = [] if match.group(1) == command else None
+        elif lines is not None:
+            lines.append(line)
+    if lines is not None:
+        output = lines
+    if output is None:
+        return None
+    return "\n".join(output)
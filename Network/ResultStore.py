@@ -0,0 +1,219 @@
+"""
+Results Store
+Keeps the results of every run in a SQLite database: the devices and their
+discovered information, their CDP/LLDP neighbors, the verification outcome
+of every sheet row and the phase timings. Runs can then be queried and
+compared without opening the workbooks.
+"""
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+VERBOSE = False
+
+DEFAULT_DB = "port_matrix_results.db"
+VERIFIED = "Verified"
+NOT_VERIFIED = "Not Verified"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started TEXT NOT NULL,
+    workbook TEXT NOT NULL,
+    options TEXT,
+    completed TEXT
+);
+CREATE TABLE IF NOT EXISTS devices (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    workbook TEXT NOT NULL,
+    host TEXT NOT NULL,
+    sheet TEXT NOT NULL,
+    hostname TEXT,
+    device_type TEXT,
+    status TEXT,
+    version TEXT,
+    model TEXT,
+    serial_number TEXT,
+    boot_image TEXT
+);
+CREATE TABLE IF NOT EXISTS neighbors (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    host TEXT NOT NULL,
+    protocol TEXT NOT NULL,
+    local_interface TEXT,
+    neighbor TEXT,
+    remote_interface TEXT
+);
+CREATE TABLE IF NOT EXISTS links (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    workbook TEXT NOT NULL,
+    host TEXT NOT NULL,
+    sheet TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    local_interface TEXT,
+    neighbor TEXT,
+    remote_interface TEXT,
+    status TEXT NOT NULL,
+    detail TEXT
+);
+CREATE TABLE IF NOT EXISTS timings (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    name TEXT NOT NULL,
+    calls INTEGER,
+    seconds REAL
+);
+CREATE INDEX IF NOT EXISTS devices_host ON devices(host, run_id);
+CREATE INDEX IF NOT EXISTS devices_sheet ON devices(sheet, run_id);
+CREATE INDEX IF NOT EXISTS neighbors_host ON neighbors(host, local_interface);
+CREATE INDEX IF NOT EXISTS links_run ON links(run_id, status);
+CREATE INDEX IF NOT EXISTS links_run_sheet ON links(run_id, workbook, sheet, local_interface);
+CREATE INDEX IF NOT EXISTS links_host ON links(host, local_interface);
+CREATE INDEX IF NOT EXISTS links_sheet ON links(sheet, local_interface);
+"""
+
+
+class ResultStore:
+    """
+    SQLite database of the runs. The add_* methods record to the run started
+    last with start_run(), each call is one batched insert. A run is only
+    listed once finish_run() marks it completed, a run that crashed is left out.
+    WorkBooks are recorded by file name.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB):
+        self.db_path = db_path
+        self.run_id = None
+        self.connection = sqlite3.connect(str(db_path))
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+        self.upgrade_schema()
+
+
+    def upgrade_schema(self):
+        """Adds the columns missing from a database created by an older version"""
+        columns = [column["name"] for column in self.connection.execute("PRAGMA table_info(runs)")]
+        if "completed" not in columns:
+            with self.connection:
+                self.connection.execute("ALTER TABLE runs ADD COLUMN completed TEXT")
+                # Runs recorded before the column existed are taken as completed
+                self.connection.execute("UPDATE runs SET completed = started")
+
+
+    def close(self):
+        """Closes the database"""
+        self.connection.close()
+
+
+    def start_run(self, workbook, options=""):
+        """Records a new run and returns its run_id"""
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO runs (started, workbook, options) VALUES (?, ?, ?)",
+                (datetime.now().isoformat(timespec="seconds"), get_workbook_name(workbook), options))
+        self.run_id = cursor.lastrowid
+        return self.run_id
+
+
+    def finish_run(self):
+        """Marks the run as completed, once all of its results are recorded"""
+        with self.connection:
+            self.connection.execute("UPDATE runs SET completed = ? WHERE run_id = ?",
+                                    (datetime.now().isoformat(timespec="seconds"), self.run_id))
+
+
+    def add_devices(self, workbook, net_devices):
+        """Records the devices, their discovered information and their neighbors"""
+        devices = []
+        neighbors = []
+        for net_dev in net_devices:
+            for sheetname in net_dev.sheetnames:
+                devices.append((self.run_id, get_workbook_name(workbook), str(net_dev.host), sheetname, net_dev.hostname,
+                                net_dev.device_type, net_dev.status, net_dev.version, join_values(net_dev.model),
+                                join_values(net_dev.serial_number), net_dev.boot_image))
+            for protocol, table in (("CDP", net_dev.cdp_neighbors), ("LLDP", net_dev.lldp_neighbors)):
+                neighbors += [(self.run_id, str(net_dev.host), protocol, neigh.local_interface, neigh.host,
+                               neigh.remote_interface) for neigh in table]
+        with self.connection:
+            self.connection.executemany("INSERT INTO devices VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", devices)
+            self.connection.executemany("INSERT INTO neighbors VALUES (?, ?, ?, ?, ?, ?)", neighbors)
+        if VERBOSE:
+            print("Stored", len(devices), "devices and", len(neighbors), "neighbors for run", self.run_id)
+
+
+    def add_links(self, workbook, links):
+        """Records the verification of the sheet rows, a list of
+        (host, sheet, row, local interface, neighbor, remote interface, status, detail)"""
+        with self.connection:
+            self.connection.executemany("INSERT INTO links VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                        [(self.run_id, get_workbook_name(workbook)) + tuple(link)
+                                         for link in links])
+
+
+    def add_timings(self, timings):
+        """Records the phase timings, a dictionary of name to (calls, seconds)"""
+        with self.connection:
+            self.connection.executemany("INSERT INTO timings VALUES (?, ?, ?, ?)",
+                                        [(self.run_id, name, calls, seconds)
+                                         for name, (calls, seconds) in timings.items()])
+
+
+    def get_runs(self, limit=20):
+        """Returns the latest completed runs with the number of links by outcome"""
+        return self.connection.execute("""
+            SELECT runs.run_id, started, runs.workbook,
+                   COUNT(links.row) AS links,
+                   SUM(links.status = ?) AS verified
+            FROM runs LEFT JOIN links ON links.run_id = runs.run_id
+            WHERE runs.completed IS NOT NULL
+            GROUP BY runs.run_id ORDER BY runs.run_id DESC LIMIT ?""", (VERIFIED, limit)).fetchall()
+
+
+    def get_failed_links(self, since=None, host=None):
+        """Returns the links that were not verified, in the completed runs
+        started after 'since' (an ISO date) and for one host if given"""
+        query = """
+            SELECT runs.run_id, started, links.workbook, host, sheet, row, local_interface, neighbor,
+                   remote_interface, status, detail
+            FROM links JOIN runs ON links.run_id = runs.run_id
+            WHERE status != ? AND runs.completed IS NOT NULL"""
+        params = [VERIFIED]
+        if since:
+            query += " AND started >= ?"
+            params.append(since)
+        if host:
+            query += " AND host = ?"
+            params.append(host)
+        query += " ORDER BY runs.run_id, host, sheet, row"
+        return self.connection.execute(query, params).fetchall()
+
+
+    def compare_runs(self, old_run, new_run):
+        """Returns the links whose outcome changed between two runs, matched by
+        workbook, sheet and local interface, with the status in each run"""
+        return self.connection.execute("""
+            SELECT new.workbook, new.sheet, new.local_interface, new.neighbor, new.remote_interface,
+                   old.status AS old_status, new.status AS new_status
+            FROM links AS new
+            LEFT JOIN links AS old ON old.run_id = ? AND old.workbook = new.workbook
+                 AND old.sheet = new.sheet AND old.local_interface = new.local_interface
+            WHERE new.run_id = ? AND (old.status IS NULL OR old.status != new.status)
+            UNION ALL
+            SELECT old.workbook, old.sheet, old.local_interface, old.neighbor, old.remote_interface,
+                   old.status, NULL
+            FROM links AS old
+            WHERE old.run_id = ? AND NOT EXISTS (
+                SELECT 1 FROM links AS new WHERE new.run_id = ? AND new.workbook = old.workbook
+                AND new.sheet = old.sheet AND new.local_interface = old.local_interface)
+            ORDER BY 1, 2, 3""", (old_run, new_run, old_run, new_run)).fetchall()
+
+
+def get_workbook_name(workbook):
+    """WorkBooks, and the directory or glob of a batch, are recorded by name"""
+    return Path(str(workbook)).name
+
+
+def join_values(value):
+    """Stacked devices report a list of models and serials"""
+    if isinstance(value, list):
+        return ",".join(value)
+    return value
@@ -0,0 +1,196 @@
+"""
+Session Log Writer
+Writes the raw CLI session logs of the devices through one background
+thread. A session only appends its output to the in-memory buffer of its
+host, the writer thread empties the buffers in batches. A log that grows
+over max_bytes is rotated to <host>_raw_cli.log.1, .2 and so on, and the
+rotated logs can be gzipped.
+"""
+import io
+import os
+import gzip
+import atexit
+import shutil
+import threading
+from datetime import datetime
+from pathlib import Path
+
+VERBOSE = False
+
+LOG_DIR = "raw_logs"
+RAW_LOG_SUFFIX = "_raw_cli.log"
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUPS = 5
+# The buffers are written at least this often, or sooner once this much is queued
+FLUSH_INTERVAL = 1.0
+FLUSH_BYTES = 256 * 1024
+BANNER = "\n" + "#"*80 + "\n" + " "*30 + "{}" + " "*30 + "\n" + "#"*80 + "\n"
+
+# Writer to LOG_DIR for the sessions that were not given one, see get_default_writer()
+DEFAULT_WRITER = None
+DEFAULT_LOCK = threading.Lock()
+
+
+class SessionLogWriter:
+    """
+    Per host buffers of session output, written to <log_dir>/<host>_raw_cli.log
+    by a daemon thread. close() writes what is left.
+    """
+
+    def __init__(self, log_dir=LOG_DIR, max_bytes=DEFAULT_MAX_BYTES, backups=DEFAULT_BACKUPS, compress=False):
+        self.log_dir = Path(log_dir)
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.compress = compress
+        # host -> list of text chunks not written yet
+        self.buffers = {}
+        self.queued = 0
+        # host -> size of its log on disk
+        self.sizes = {}
+        self.condition = threading.Condition()
+        self.closed = False
+        self.rotations = 0
+        self.thread = threading.Thread(target=self.__write_loop, name="session-log-writer", daemon=True)
+        self.thread.start()
+
+
+    def open_log(self, host):
+        """Returns the file object handed to netmiko as the session_log of a
+        host, a time stamp banner is written first"""
+        self.write(host, BANNER.format(datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+        return HostLog(self, host)
+
+
+    def write(self, host, text):
+        """Queues text for the log of a host"""
+        with self.condition:
+            self.buffers.setdefault(host, []).append(text)
+            self.queued += len(text)
+            if self.queued >= FLUSH_BYTES:
+                self.condition.notify()
+
+
+    def close(self):
+        """Writes every queued buffer and stops the writer thread"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.thread.join()
+
+
+    def get_log_path(self, host):
+        """Returns the current log file of a host"""
+        return get_log_path(self.log_dir, host)
+
+
+    def __write_loop(self):
+        """Writer thread, empties the buffers until closed"""
+        while True:
+            with self.condition:
+                if not self.closed and self.queued < FLUSH_BYTES:
+                    self.condition.wait(FLUSH_INTERVAL)
+                buffers, self.buffers, self.queued = self.buffers, {}, 0
+                closed = self.closed
+            for host, chunks in buffers.items():
+                try:
+                    self.__write_host(host, "".join(chunks))
+                except OSError as e:
+                    print("{} | Unable to write the session log. REASON:\n{}".format(host, e))
+            if closed:
+                return
+
+
+    def __write_host(self, host, text):
+        """Appends to the log of a host in one write, rotating it when full"""
+        log_path = self.get_log_path(host)
+        if host not in self.sizes:
+            self.sizes[host] = log_path.stat().st_size if log_path.exists() else 0
+        data = text.encode("utf-8", errors="replace")
+        with open(log_path, "ab") as filehandle:
+            filehandle.write(data)
+        self.sizes[host] += len(data)
+        if self.max_bytes and self.sizes[host] >= self.max_bytes:
+            self.__rotate(log_path)
+            self.sizes[host] = 0
+
+
+    def __rotate(self, log_path):
+        """Shifts <log>.1 .. <log>.<backups-1> up by one and moves the log to <log>.1"""
+        suffix = ".gz" if self.compress else ""
+        oldest = Path("{}.{}{}".format(log_path, self.backups, suffix))
+        if oldest.exists():
+            oldest.unlink()
+        for index in range(self.backups - 1, 0, -1):
+            rotated = Path("{}.{}{}".format(log_path, index, suffix))
+            if rotated.exists():
+                rotated.rename("{}.{}{}".format(log_path, index + 1, suffix))
+        if self.compress:
+            with open(log_path, "rb") as source, gzip.open("{}.1.gz".format(log_path), "wb") as target:
+                shutil.copyfileobj(source, target)
+            os.unlink(log_path)
+        else:
+            log_path.rename("{}.1".format(log_path))
+        self.rotations += 1
+        if VERBOSE:
+            print("Rotated the session log", log_path)
+
+
+class HostLog(io.BufferedIOBase):
+    """Write only file object of one host, netmiko writes the session output to it"""
+
+    def __init__(self, writer, host):
+        super().__init__()
+        self.writer = writer
+        self.host = host
+
+
+    def writable(self):
+        return True
+
+
+    def write(self, data):
+        if isinstance(data, (bytes, bytearray)):
+            self.writer.write(self.host, data.decode("utf-8", errors="replace"))
+        else:
+            self.writer.write(self.host, data)
+        return len(data)
+
+
+def get_default_writer():
+    """Returns the SessionLogWriter to LOG_DIR with the default settings,
+    started on first use and closed when the script exits"""
+    global DEFAULT_WRITER
+    with DEFAULT_LOCK:
+        if DEFAULT_WRITER is None:
+            DEFAULT_WRITER = SessionLogWriter()
+            atexit.register(DEFAULT_WRITER.close)
+        return DEFAULT_WRITER
+
+
+def get_log_path(log_dir, host):
+    """Returns the current log file of a host in log_dir"""
+    return Path(log_dir) / (str(host) + RAW_LOG_SUFFIX)
+
+
+def get_log_files(log_dir, host):
+    """Returns the existing log files of a host, newest first: the current log
+    then the rotated ones, plain or gzipped"""
+    log_path = get_log_path(log_dir, host)
+    log_files = [log_path] if log_path.exists() else []
+    index = 1
+    while True:
+        rotated = [Path("{}.{}{}".format(log_path, index, suffix)) for suffix in ("", ".gz")]
+        rotated = [path for path in rotated if path.exists()]
+        if not rotated:
+            return log_files
+        log_files += rotated
+        index += 1
+
+
+def read_log(log_path):
+    """Returns the text of a log file, gzipped or not"""
+    if str(log_path).endswith(".gz"):
+        with gzip.open(log_path, "rt", errors="replace") as filehandle:
+            return filehandle.read()
+    return Path(log_path).read_text(errors="replace")
@@ -0,0 +1,120 @@
+"""
+SSH Session Pool
+Keeps the netmiko sessions of the devices open between collections, so a
+long running process only logs in to a device once. Sessions that have not
+been used for idle_timeout seconds are disconnected.
+"""
+import time
+import threading
+
+VERBOSE = False
+
+DEFAULT_IDLE_TIMEOUT = 300
+DEFAULT_MAX_SESSIONS = 64
+
+
+class SessionPool:
+    """
+    Open sessions keyed by device. A session is only handed to one user at a
+    time, acquire() returns it and release() puts it back in the pool.
+    """
+
+    def __init__(self, idle_timeout=DEFAULT_IDLE_TIMEOUT, max_sessions=DEFAULT_MAX_SESSIONS):
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        # key -> (connection, time it was released), idle sessions only
+        self.idle = {}
+        self.lock = threading.Lock()
+        self.logins = 0
+        self.reuses = 0
+
+
+    def acquire(self, key, connect):
+        """
+        Returns the idle session of the key if it is still alive, otherwise
+        the new session returned by connect().
+        """
+        with self.lock:
+            connection, released = self.idle.pop(key, (None, None))
+        if connection is not None:
+            if is_alive(connection):
+                self.reuses += 1
+                if VERBOSE:
+                    print(key[0], "| Reusing the open session")
+                return connection
+            close(connection)
+        self.logins += 1
+        return connect()
+
+
+    def release(self, key, connection):
+        """Puts a session back in the pool, the oldest idle one is closed if the pool is full"""
+        to_close = []
+        with self.lock:
+            old = self.idle.pop(key, None)
+            if old is not None:
+                to_close.append(old[0])
+            self.idle[key] = (connection, time.monotonic())
+            while len(self.idle) > self.max_sessions:
+                oldest = min(self.idle, key=lambda idle_key: self.idle[idle_key][1])
+                to_close.append(self.idle.pop(oldest)[0])
+        for old_connection in to_close:
+            close(old_connection)
+
+
+    def discard(self, key, connection):
+        """Closes a session that must not be used again"""
+        with self.lock:
+            if key in self.idle and self.idle[key][0] is connection:
+                del self.idle[key]
+        close(connection)
+
+
+    def evict_idle(self):
+        """Closes the sessions idle for longer than idle_timeout, returns how many"""
+        limit = time.monotonic() - self.idle_timeout
+        with self.lock:
+            expired = [key for key, (connection, released) in self.idle.items() if released < limit]
+            connections = [self.idle.pop(key)[0] for key in expired]
+        for connection in connections:
+            close(connection)
+        if VERBOSE and expired:
+            print("Closed", len(expired), "idle sessions")
+        return len(expired)
+
+
+    def close_all(self):
+        """Closes every idle session"""
+        with self.lock:
+            connections = [connection for connection, released in self.idle.values()]
+            self.idle = {}
+        for connection in connections:
+            close(connection)
+
+
+    def start_eviction(self, interval=None):
+        """Runs evict_idle() every interval seconds in a daemon thread"""
+        interval = interval or max(1, self.idle_timeout / 4)
+        def evict_loop():
+            while True:
+                time.sleep(interval)
+                self.evict_idle()
+        thread = threading.Thread(target=evict_loop, name="session-eviction", daemon=True)
+        thread.start()
+        return thread
+
+
+def is_alive(connection):
+    """Returns True if the session can still be used"""
+    try:
+        return connection.is_alive()
+    except Exception:
+        return False
+
+
+def close(connection):
+    """Disconnects a session, ignoring a session that is already gone"""
+    try:
+        connection.disconnect()
+    except Exception:
+        pass
@@ -0,0 +1,99 @@
+"""
+Topology Verification
+Builds one adjacency index from the CDP/LLDP neighbors of every collected
+device and one from columns A-C of every device sheet, then checks every
+sheet row against both ends of the link with dictionary lookups.
+
+Interface names are compared by their cisco_ios short name, so both ends of
+a link use the same key whatever the device type of either end is.
+"""
+from Network.Interfaces import get_if_key, get_host_key
+
+VERIFIED = "Verified"
+ONE_SIDED = "One-sided"
+MISMATCHED = "Mismatched"
+MISSING = "Missing"
+
+
+class Topology:
+    """Discovered and planned links of every device, keyed by (host, interface)"""
+
+    def __init__(self):
+        # (host, local interface) -> {(neighbor, remote interface): set of protocols}
+        self.discovered = {}
+        # (host, local interface) -> set of (neighbor, remote interface) from the sheets
+        self.planned = {}
+        # (sheetname, row, host, local interface, neighbor, remote interface)
+        self.rows = []
+        # Hosts with discovered neighbors, only their silence means anything
+        self.collected = set()
+        self.sheet_hosts = set()
+
+
+    def add_neighbors(self, host, neighbors, protocol):
+        """Adds the CDP or LLDP Neighbor records of a device"""
+        host = get_node_key(host)
+        self.collected.add(host)
+        for neigh in neighbors:
+            link = (neigh.mod_host.lower(), get_if_key(neigh.remote_interface))
+            protocols = self.discovered.setdefault((host, get_if_key(neigh.local_interface)), {})
+            protocols.setdefault(link, set()).add(protocol)
+
+
+    def add_sheet(self, host, sheet):
+        """Adds the rows of a device sheet with all of columns A-C filled in"""
+        host = get_node_key(host)
+        self.sheet_hosts.add(host)
+        for row in sheet.rows():
+            local_if, neighbor, remote_if = (sheet.get_value(column, row) for column in (1, 2, 3))
+            if local_if in (None, "") or neighbor in (None, "") or remote_if in (None, ""):
+                continue
+            entry = (sheet.name, row, host, get_if_key(str(local_if)),
+                     get_node_key(str(neighbor)), get_if_key(str(remote_if)))
+            self.rows.append(entry)
+            self.planned.setdefault(entry[2:4], set()).add(entry[4:6])
+
+
+    def reconcile(self):
+        """
+        Yields (sheetname, row, status, text) for every sheet row, in one pass
+        over the rows. Rows of a device that was not collected are only
+        reported when the far end has something to say about the link.
+        """
+        for sheetname, row, host, local_if, neighbor, remote_if in self.rows:
+            near = self.discovered.get((host, local_if), {})
+            far = self.discovered.get((neighbor, remote_if), {})
+            notes = []
+            if (neighbor, remote_if) in near:
+                status = VERIFIED
+                notes = ["Verified via " + protocol for protocol in sorted(near[(neighbor, remote_if)])]
+            elif near:
+                status = MISMATCHED
+                notes = ["{} seen on this port".format(format_links(near))]
+            elif (host, local_if) in far:
+                status = ONE_SIDED
+                notes = ["Only seen from {} via {}".format(neighbor, ", ".join(sorted(far[(host, local_if)])))]
+            elif far:
+                status = MISMATCHED
+                notes = ["{} reports {} on {}".format(neighbor, format_links(far), remote_if)]
+            elif host in self.collected or neighbor in self.collected:
+                status = MISSING
+                notes = ["Not seen from either end"]
+            else:
+                continue
+            far_planned = self.planned.get((neighbor, remote_if))
+            if far_planned is not None and (host, local_if) not in far_planned:
+                notes.append("Sheet of {} has {} on {}".format(neighbor, format_links(far_planned), remote_if))
+            elif far_planned is None and neighbor in self.sheet_hosts:
+                notes.append("Sheet of {} has no row for {}".format(neighbor, remote_if))
+            yield sheetname, row, status, "\n".join(notes)
+
+
+def get_node_key(hostname):
+    """Lower case hostname without the domain"""
+    return get_host_key(hostname).lower()
+
+
+def format_links(links):
+    """Formats (neighbor, interface) pairs for a Connection Status cell"""
+    return ", ".join("{} {}".format(neighbor, interface) for neighbor, interface in sorted(links))
@@ -0,0 +1,104 @@
+"""
+Timing Trace
+Records how long each phase of a run and each device step took, with counters
+such as rows rendered, neighbors parsed and bytes received. The trace is saved
+in the Chrome trace format, it can be opened in chrome://tracing or Perfetto.
+Nothing is recorded unless ENABLED is set.
+"""
+import os
+import time
+import json
+import threading
+from contextlib import contextmanager
+
+ENABLED = False
+
+EVENTS = []
+COUNTERS = {}
+TRACE_LOCK = threading.Lock()
+START_TIME = time.perf_counter()
+# Number of devices listed in the summary
+SLOWEST_COUNT = 5
+
+
+@contextmanager
+def span(name, host=None, **args):
+    """
+    Times the block as one event. Counters can be added to the dictionary
+    that is yielded, they are saved as the arguments of the event.
+    """
+    if not ENABLED:
+        yield args
+        return
+    start = time.perf_counter()
+    try:
+        yield args
+    finally:
+        end = time.perf_counter()
+        if host is not None:
+            args["host"] = str(host)
+        event = {
+            "name": name,
+            "cat": "device" if host is not None else "phase",
+            "ph": "X",
+            "ts": round((start - START_TIME) * 1e6),
+            "dur": round((end - start) * 1e6),
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": args
+        }
+        with TRACE_LOCK:
+            EVENTS.append(event)
+
+
+def count(name, value=1):
+    """Adds value to a run wide counter"""
+    if ENABLED:
+        with TRACE_LOCK:
+            COUNTERS[name] = COUNTERS.get(name, 0) + value
+
+
+def save(file_path):
+    """Writes the events and counters to a Chrome trace JSON file"""
+    with TRACE_LOCK:
+        trace = {"traceEvents": list(EVENTS), "otherData": dict(COUNTERS)}
+    with open(file_path, "w") as filehandle:
+        json.dump(trace, filehandle)
+
+
+def get_phase_totals():
+    """Returns a dictionary of event name to (count, total seconds)"""
+    totals = {}
+    for event in EVENTS:
+        calls, seconds = totals.get(event["name"], (0, 0))
+        totals[event["name"]] = (calls + 1, seconds + event["dur"] / 1e6)
+    return totals
+
+
+def get_device_totals():
+    """Returns a dictionary of host to the total seconds of its device events"""
+    totals = {}
+    for event in EVENTS:
+        if event["cat"] == "device":
+            host = event["args"]["host"]
+            totals[host] = totals.get(host, 0) + event["dur"] / 1e6
+    return totals
+
+
+def print_summary():
+    """Prints the time spent in each phase, the slowest devices and the counters"""
+    with TRACE_LOCK:
+        phases = get_phase_totals()
+        devices = get_device_totals()
+        counters = dict(COUNTERS)
+    print("Timing summary:")
+    for name, (calls, seconds) in sorted(phases.items(), key=lambda item: -item[1][1]):
+        print("  {:<24}{:>6} x {:>10.3f}s".format(name, calls, seconds))
+    if devices:
+        print("Slowest devices:")
+        for host, seconds in sorted(devices.items(), key=lambda item: -item[1])[:SLOWEST_COUNT]:
+            print("  {:<24}{:>19.3f}s".format(host, seconds))
+    if counters:
+        print("Counters:")
+    for name, value in counters.items():
+        print("  {:<24}{:>20}".format(name, value))
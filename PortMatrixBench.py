@@ -0,0 +1,248 @@
+"""
+Port Matrix Benchmark
+Builds a synthetic workbook and times each phase of PortMatrixHelper on it,
+reporting throughput and, with --memory, peak memory. A run can be stored as
+a baseline and later runs compared against it.
+"""
+import time
+import json
+import sys
+import optparse
+import tempfile
+import subprocess
+import tracemalloc
+from pathlib import Path
+import PortMatrixHelper
+import Network.Network as Network
+import Network.Parsers as Parsers
+import Matrix.Workbook as Workbook
+import Matrix.Render as Render
+import Matrix.Synthetic as Synthetic
+import Matrix.Export as Export
+
+DEFAULT_THRESHOLD = 0.2
+# Phases faster than this are too noisy to be called a regression
+MIN_REGRESSION_SECONDS = 0.05
+# Seconds allowed to import PortMatrixHelper for a configuration only run
+STARTUP_BUDGET = 0.5
+# Modules a configuration only run must not import
+NETWORK_MODULES = ["netmiko", "paramiko", "textfsm"]
+STARTUP_SCRIPT = """
+import sys, time, json
+start = time.perf_counter()
+import PortMatrixHelper
+seconds = time.perf_counter() - start
+loaded = sorted(set(sys.modules) & set({modules}))
+start = time.perf_counter()
+PortMatrixHelper.load_network_modules()
+network_seconds = time.perf_counter() - start
+print(json.dumps([seconds, loaded, network_seconds, sorted(set(sys.modules) & set({modules}))]))
+"""
+
+
+def cli_args():
+    """Reads the CLI options provided and returns them as a dictionary"""
+    parser = optparse.OptionParser()
+    parser.add_option('--sheets', dest="sheets", default=10, type="int", action="store",
+                      help="Number of device sheets in the synthetic workbook.")
+    parser.add_option('--rows', dest="rows", default=500, type="int", action="store",
+                      help="Number of rows per device sheet, also the number of CDP and LLDP neighbors.")
+    parser.add_option('--columns', dest="columns", default=12, type="int", action="store",
+                      help="Number of columns per device sheet.")
+    parser.add_option('--templates', dest="templates", default=4, type="int", action="store",
+                      help="Number of configuration templates in the Settings sheet.")
+    parser.add_option('-s','--stream', dest="stream", default=False, action="store_true",
+                      help="Open the workbook in read-only streaming mode.")
+    parser.add_option('--save_baseline', dest="save_baseline", action="store",
+                      help="Store the results of this run as a baseline JSON file.")
+    parser.add_option('--compare', dest="compare", action="store",
+                      help="Compare this run against a baseline JSON file, exits with 1 on a regression.")
+    parser.add_option('--threshold', dest="threshold", default=DEFAULT_THRESHOLD, type="float", action="store",
+                      help="Allowed slow down against the baseline before it is a regression, 0.2 is 20%.")
+    parser.add_option('--startup_budget', dest="startup_budget", default=STARTUP_BUDGET, type="float", action="store",
+                      help="Seconds allowed to start PortMatrixHelper for a configuration only run, exits with 1 if over.")
+    parser.add_option('--memory', dest="memory", default=False, action="store_true",
+                      help="Also measure the peak memory of every phase, in a second pass that is not timed.")
+    options, remainder = parser.parse_args()
+    return vars(options)
+
+
+class Phase:
+    """Times a phase, use as a context manager. With trace_memory the peak
+    memory is recorded too, tracemalloc slows the phase down so the timing
+    of such a pass is not comparable"""
+
+    def __init__(self, results, name, items=0, unit="rows", trace_memory=False):
+        self.results = results
+        self.name = name
+        self.items = items
+        self.unit = unit
+        self.trace_memory = trace_memory
+
+
+    def __enter__(self):
+        if self.trace_memory:
+            tracemalloc.start()
+        self.start = time.perf_counter()
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        seconds = time.perf_counter() - self.start
+        peak = None
+        if self.trace_memory:
+            peak = tracemalloc.get_traced_memory()[1] / 2**20
+            tracemalloc.stop()
+        self.results[self.name] = {
+            "seconds": seconds,
+            "peak_mb": peak,
+            "items": self.items,
+            "unit": self.unit,
+            "per_second": self.items / seconds if seconds and self.items else 0
+        }
+
+
+def run_benchmark(setup, work_dir, trace_memory=False):
+    """Runs every phase on a synthetic workbook in work_dir, returns the results by phase.
+    With trace_memory the peak memory of every phase is measured"""
+    header_index = Synthetic.HEADER_ROW
+    xls_path = Path(work_dir)/"bench.xlsx"
+    Synthetic.build_workbook(xls_path, setup["sheets"], setup["rows"], setup["columns"], setup["templates"])
+    total_rows = setup["sheets"] * setup["rows"]
+    results = {}
+
+    with Phase(results, "open_xls", total_rows, trace_memory=trace_memory):
+        wb_obj = PortMatrixHelper.open_xls(xls_path, setup["stream"])
+        config_templates = PortMatrixHelper.get_config_templates(wb_obj["Settings"])
+        render_plans = Render.compile_templates(config_templates)
+        ignore_sheets = PortMatrixHelper.get_ignore_sheets(wb_obj["Settings"])
+        sheets = PortMatrixHelper.read_sheets(wb_obj, ignore_sheets, header_index,
+                                              PortMatrixHelper.get_needed_headers(render_plans))
+    output = Workbook.ResultWriter()
+
+    rendered_rows = sum(1 for sheet in sheets.values() for name in sheet.get_column("Template") if name)
+    with Phase(results, "gen_cfg_by_ws", rendered_rows, trace_memory=trace_memory):
+        PortMatrixHelper.gen_cfg_by_ws(sheets, render_plans, output)
+
+    net_devices = PortMatrixHelper.read_device_information(sheets)
+    raw_outputs = {}
+    for sheet_index, net_dev in enumerate(net_devices):
+        raw_outputs[net_dev.host] = {
+            Network.VERSION_CMD: Synthetic.build_version_output(sheet_index),
+            Network.CDP_CMD: Synthetic.build_cdp_output(sheet_index, setup["rows"]),
+            Network.LLDP_CMD: Synthetic.build_lldp_output(sheet_index, setup["rows"])
+        }
+    # Templates are compiled outside of the timing, the same as --preload_templates
+    Parsers.get_registry().warm_up(["cisco_ios"], Network.GATHER_CMDS)
+    with Phase(results, "neighbor_parsing", 2 * total_rows, "neighbors", trace_memory=trace_memory):
+        for net_dev in net_devices:
+            outputs = raw_outputs[net_dev.host]
+            net_dev.load_show_output({cmd: Parsers.parse_output(net_dev.device_type, cmd, outputs[cmd])
+                                      for cmd in Network.GATHER_CMDS})
+            net_dev.status = "Data Gathered"
+
+    with Phase(results, "check_net_dev_connection", total_rows, trace_memory=trace_memory):
+        for net_dev in net_devices:
+            for sheetname in net_dev.sheetnames:
+                net_dev.unmatched_rows[sheetname] = PortMatrixHelper.check_net_dev_connection(
+                    net_dev, sheets[sheetname], output)
+            net_dev.status = "Complete"
+            PortMatrixHelper.update_discovered_data(net_dev, output)
+    unmatched = sum(len(rows) for net_dev in net_devices for rows in net_dev.unmatched_rows.values())
+    if unmatched:
+        print("Warning:", unmatched, "rows were not verified, the synthetic neighbors do not match the sheets.")
+
+    with Phase(results, "save_xls", total_rows, trace_memory=trace_memory):
+        PortMatrixHelper.save_results(wb_obj, output, xls_path, Path(work_dir)/"bench_out.xlsx")
+    with Phase(results, "save_xls_write_only", total_rows, trace_memory=trace_memory):
+        PortMatrixHelper.save_results(None, output, xls_path, Path(work_dir)/"bench_out_wo.xlsx", True)
+
+    exporter = Export.ConfigExporter(Path(work_dir)/"export", export_only=True)
+    with Phase(results, "export_configs", rendered_rows, trace_memory=trace_memory):
+        PortMatrixHelper.gen_cfg_by_ws(sheets, render_plans, Workbook.ResultWriter(), exporter=exporter)
+    return results
+
+
+def measure_startup():
+    """
+    Imports PortMatrixHelper in a new interpreter, the same as a '-g' run
+    before the workbook is opened, then loads the network stack the way '-c'
+    does. Returns the seconds the import took, the network modules it
+    imported, the seconds load_network_modules() took and the network
+    modules imported after it.
+    """
+    script = STARTUP_SCRIPT.format(modules=NETWORK_MODULES)
+    output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True,
+                            cwd=Path(__file__).parent).stdout
+    seconds, loaded, network_seconds, network_loaded = json.loads(output.splitlines()[-1])
+    return seconds, loaded, network_seconds, network_loaded
+
+
+def check_startup(budget):
+    """Prints the startup time of a configuration only run, returns False if it is over budget"""
+    seconds, loaded, network_seconds, network_loaded = measure_startup()
+    print("Startup for a configuration only run: {:.3f}s, budget {:.3f}s".format(seconds, budget))
+    print("Network modules loaded on first use in: {:.3f}s".format(network_seconds))
+    if loaded:
+        print("The network modules were imported:", ", ".join(loaded))
+    return seconds <= budget and not loaded
+
+
+def print_results(results, baseline=None):
+    """Prints a table of the results, with the change against the baseline if given"""
+    print("{:<26}{:>10}{:>12}{:>16}{:>10}".format("Phase", "Seconds", "Peak MB", "Throughput/s", "Change"))
+    for name, phase in results.items():
+        change = ""
+        if baseline and name in baseline:
+            change = "{:+.0%}".format(phase["seconds"] / baseline[name]["seconds"] - 1)
+        peak_mb = "-" if phase["peak_mb"] is None else "{:.1f}".format(phase["peak_mb"])
+        print("{:<26}{:>10.3f}{:>12}{:>16}{:>10}".format(
+            name, phase["seconds"], peak_mb,
+            "{:.0f} {}".format(phase["per_second"], phase["unit"]), change))
+
+
+def find_regressions(results, baseline, threshold):
+    """Returns the phases that are slower than the baseline by more than threshold"""
+    return [name for name, phase in results.items()
+            if name in baseline and phase["seconds"] > baseline[name]["seconds"] * (1 + threshold)
+            and phase["seconds"] - baseline[name]["seconds"] > MIN_REGRESSION_SECONDS]
+
+
+###### MAIN ######
+def main():
+    setup = cli_args()
+    config = {key: setup[key] for key in ("sheets", "rows", "columns", "templates", "stream")}
+    print("Benchmark:", ", ".join("{}={}".format(key, value) for key, value in config.items()))
+    with tempfile.TemporaryDirectory() as work_dir:
+        results = run_benchmark(setup, work_dir)
+        if setup["memory"]:
+            # A separate pass, tracemalloc would slow down the timed one
+            memory = run_benchmark(setup, work_dir, trace_memory=True)
+            for name, phase in results.items():
+                phase["peak_mb"] = memory[name]["peak_mb"]
+
+    baseline = None
+    if setup["compare"]:
+        with open(setup["compare"]) as filehandle:
+            stored = json.load(filehandle)
+        if stored["config"] != config:
+            print("Warning: the baseline was run with", stored["config"])
+        baseline = stored["phases"]
+    print_results(results, baseline)
+
+    if setup["save_baseline"]:
+        with open(setup["save_baseline"], "w") as filehandle:
+            json.dump({"config": config, "phases": results}, filehandle, indent=2)
+        print("Baseline saved to:", setup["save_baseline"])
+    failed = not check_startup(setup["startup_budget"])
+    if baseline:
+        regressions = find_regressions(results, baseline, setup["threshold"])
+        if regressions:
+            print("Regression in:", ", ".join(regressions))
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
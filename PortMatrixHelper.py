@@ -4,15 +4,53 @@ from pathlib import Path
 import optparse
 import sys
 import os
-import Network.Network as Network
+import multiprocessing
+import concurrent.futures
+import glob
+import Network.Collector as Collector
+import Network.DiscoveryCache as DiscoveryCache
+import Network.Reachability as Reachability
+import Network.Trace as Trace
+import Network.Topology as Topology
+import Network.ResultStore as ResultStore
+import Network.SessionLog as SessionLog
+import Matrix.Workbook as Workbook
+import Matrix.Render as Render
+import Matrix.Incremental as Incremental
+import Matrix.Export as Export
 
 # Import TextFSM
 os.environ["NET_TEXTFSM"] = str(Path(os.getcwd())/Path("Network/ntc-templates/templates"))
 
 DEFAULT_IGNORE_SHEETS = ["Comments", "Settings"]
+# Headers the script itself reads, always kept when reading the device sheets
+SCRIPT_HEADERS = ["Template", "Configuration"]
+# Device information that tells devices apart, see get_device_key()
+DEVICE_KEY_FIELDS = ["host", "device_type", "username", "password", "secret"]
 
 VERBOSE = False
 
+# Network.Network, Network.Replay and Network.Parsers pull in netmiko, paramiko
+# and TextFSM, they are only imported by load_network_modules() when a device
+# is checked, so configuration only runs start quickly.
+Network = None
+Replay = None
+Parsers = None
+
+
+def load_network_modules():
+    """Imports the network stack on first use"""
+    global Network, Replay, Parsers
+    if Network is None:
+        if VERBOSE:
+            print("Loading the network modules")
+        import Network.Network as Network
+        import Network.Replay as Replay
+        import Network.Parsers as Parsers
+        Network.VERBOSE = VERBOSE
+        Replay.VERBOSE = VERBOSE
+        Parsers.VERBOSE = VERBOSE
+
 
 def cli_args():
     """Reads the CLI options provided and returns them using the OptionParser
@@ -47,21 +85,194 @@ def cli_args():
                       action="store_true",
                       help="Logs in to the devices, checks if connection matches the outline connection in the spreadsheet. Will check via CDP and LLDP. Will also gather SN information and other basic info from 'show version'."
                       )
+    parser.add_option('-w','--workers',
+                      dest="workers",
+                      default=Collector.DEFAULT_WORKERS,
+                      type="int",
+                      action="store",
+                      help="Number of devices to collect from at the same time when checking connections."
+                      )
+    parser.add_option('-t','--timeout',
+                      dest="timeout",
+                      default=Collector.DEFAULT_TIMEOUT,
+                      type="int",
+                      action="store",
+                      help="Time limit in seconds for the collection of a single device."
+                      )
+    parser.add_option('--backend',
+                      dest="backend",
+                      default="thread",
+                      type="choice",
+                      choices=Collector.BACKENDS,
+                      action="store",
+                      help="Collection backend used when checking connections, 'thread' or 'async'."
+                      )
+    parser.add_option('-p','--processes',
+                      dest="processes",
+                      default=1,
+                      type="int",
+                      action="store",
+                      help="Number of processes used to generate configuration, one sheet per process at a time."
+                      )
+    parser.add_option('-s','--stream',
+                      dest="stream",
+                      default=False,
+                      action="store_true",
+                      help="Read the workbook in read-only streaming mode, meant for large workbooks. Only the reading is streamed: saving loads the whole workbook again unless it is saved with '--write_only'."
+                      )
+    parser.add_option('--replay',
+                      dest="replay",
+                      action="store",
+                      help="Directory of captured CLI output to parse when checking connections instead of logging in to the devices."
+                      )
+    parser.add_option('--preload_templates',
+                      dest="preload_templates",
+                      default=False,
+                      action="store_true",
+                      help="Compile the TextFSM templates for the device types in the workbook before connecting to the devices."
+                      )
+    parser.add_option('--timing_file',
+                      dest="timing_file",
+                      action="store",
+                      help="JSON file of connection and read timing settings by device type, overrides the defaults."
+                      )
+    parser.add_option('--probe',
+                      dest="probe",
+                      default=False,
+                      action="store_true",
+                      help="Check port 22 of every device at the same time before logging in, devices that do not answer are marked 'Unreachable'."
+                      )
+    parser.add_option('--probe_timeout',
+                      dest="probe_timeout",
+                      default=Reachability.DEFAULT_TIMEOUT,
+                      type="float",
+                      action="store",
+                      help="Time in seconds to wait for port 22 to answer when probing."
+                      )
+    parser.add_option('--attempts',
+                      dest="attempts",
+                      default=Collector.DEFAULT_ATTEMPTS,
+                      type="int",
+                      action="store",
+                      help="Number of times a device is tried when its login or collection fails, 1 to never retry."
+                      )
+    parser.add_option('--retry_backoff',
+                      dest="retry_backoff",
+                      default=Collector.DEFAULT_BACKOFF,
+                      type="float",
+                      action="store",
+                      help="Seconds to wait before the first retry of a device, doubled for every further retry."
+                      )
+    parser.add_option('--session_logs',
+                      dest="session_logs",
+                      default=False,
+                      action="store_true",
+                      help="Write the raw CLI output of every session to '<log_dir>/<host>_raw_cli.log', through one background writer."
+                      )
+    parser.add_option('--log_dir',
+                      dest="log_dir",
+                      default=SessionLog.LOG_DIR,
+                      action="store",
+                      help="Directory of the session logs."
+                      )
+    parser.add_option('--log_max_mb',
+                      dest="log_max_mb",
+                      default=SessionLog.DEFAULT_MAX_BYTES // (1024 * 1024),
+                      type="int",
+                      action="store",
+                      help="Size in MB a session log is rotated at, the last 5 rotated logs are kept."
+                      )
+    parser.add_option('--log_compress',
+                      dest="log_compress",
+                      default=False,
+                      action="store_true",
+                      help="Gzip the rotated session logs."
+                      )
+    parser.add_option('--incremental',
+                      dest="incremental",
+                      default=False,
+                      action="store_true",
+                      help="Only generate configuration for the rows that changed since the last run, row fingerprints are kept in a file next to the workbook."
+                      )
+    parser.add_option('--cache',
+                      dest="cache",
+                      default=False,
+                      action="store_true",
+                      help="Use the discovery cache when checking connections, devices with fresh cached data are not logged in to."
+                      )
+    parser.add_option('--cache_ttl',
+                      dest="cache_ttl",
+                      default=DiscoveryCache.DEFAULT_TTL,
+                      type="int",
+                      action="store",
+                      help="Time in seconds the cached discovery data of a device is used for."
+                      )
+    parser.add_option('--refresh_cache',
+                      dest="refresh_cache",
+                      default=False,
+                      action="store_true",
+                      help="Ignore the cached discovery data, log in to every device and cache the new data."
+                      )
+    parser.add_option('--invalidate_cache',
+                      dest="invalidate_cache",
+                      default=[],
+                      action="append",
+                      help="Remove the cached discovery data of a host, can be given more than once."
+                      )
+    parser.add_option('--export_dir',
+                      dest="export_dir",
+                      action="store",
+                      help="Also write the generated configuration of each Sheet to a text file in this directory, as each Sheet is rendered."
+                      )
+    parser.add_option('--export_only',
+                      dest="export_only",
+                      default=False,
+                      action="store_true",
+                      help="With '--export_dir' the configuration is not written to the WorkBook, it is only saved if there are other results."
+                      )
+    parser.add_option('--write_only',
+                      dest="write_only",
+                      default=False,
+                      action="store_true",
+                      help="Save by streaming the rows of the input WorkBook into a new one with the results applied. Memory stays flat and formulas are kept, but cell formatting, merged cells, column widths and data validation are lost."
+                      )
+    parser.add_option('-b','--batch',
+                      dest="batch",
+                      action="store",
+                      help="Directory or glob of WorkBooks to process together, i.e. 'sites/*.xlsx'. The '-o' option is then the output directory."
+                      )
+    parser.add_option('--topology',
+                      dest="topology",
+                      default=False,
+                      action="store_true",
+                      help="Verify the rows once every device is collected, against the neighbors and the sheets of both ends of each link."
+                      )
+    parser.add_option('--results_db',
+                      dest="results_db",
+                      action="store",
+                      help="Also record the devices, neighbors, row verification and timings of the run in this SQLite database."
+                      )
+    parser.add_option('--trace',
+                      dest="trace",
+                      action="store",
+                      help="Save the timing of every phase and device step to this file, in the Chrome trace JSON format."
+                      )
     options, remainder = parser.parse_args()
     # Utilizing the vars() method we can return the options as a dictionary
     return vars(options)
 
 
-def open_xls(xls_file_name):
+def open_xls(xls_file_name, read_only=False):
     """Returns the WorkBook of specified Name
-    Name of XLS file must be imported as a Path"""
+    Name of XLS file must be imported as a Path
+    With read_only the WorkBook is streamed, it can only be read from."""
     if not xls_file_name.exists():
         print("The following file does not exists:", xls_file_name)
         print("Please ensure the file exists or the correct filename was entered when utilizing the '-i | --input_file' option.")
         sys.exit()
     if VERBOSE:
         print("Opening Excel sheet:", xls_file_name)
-    return openpyxl.load_workbook(xls_file_name, data_only=True)
+    return openpyxl.load_workbook(xls_file_name, read_only=read_only, data_only=True)
 
 
 def add_xls_tag(file_name):
@@ -84,9 +295,7 @@ def rw_cell(sheet_obj, row, column, value=None):
 def get_config_templates(ws_obj):
     """Reads the Templates from the Excel Sheet"""
     return_dict = {}
-    for row in range(1, 1+len(ws_obj["A"])):
-        key = rw_cell(ws_obj, row, 1)
-        value = rw_cell(ws_obj, row, 2)
+    for key, value in ws_obj.iter_rows(min_col=1, max_col=2, values_only=True):
         if key != None:
             if key not in return_dict.keys():
                 return_dict[key] = value
@@ -100,70 +309,145 @@ def get_config_templates(ws_obj):
 def get_ignore_sheets(ws_obj):
     """Get the List of Sheet Names to Ignore"""
     return_list = DEFAULT_IGNORE_SHEETS.copy()
-    for row in range(2, 1+len(ws_obj["D"])):
-        value = rw_cell(ws_obj, row, 4)
+    for (value,) in ws_obj.iter_rows(min_row=2, min_col=4, max_col=4, values_only=True):
         if value:
             return_list.append(value)
     return return_list
 
 
-def gen_cfg_by_ws(wb_obj, config_templates, ignore_sheets, header_index):
-    """Cycles through the Worksheets and will ignore any worksheets in the
-    ignore_sheets list as defined in 'Settings' Sheet"""
-    for sheetname  in wb_obj.sheetnames:
-        if sheetname not in ignore_sheets:
-            gen_config_to_cell(wb_obj[sheetname], config_templates, header_index)
+def get_needed_headers(render_plans):
+    """Returns the Headers used by the script and by any of the templates"""
+    needed_headers = set(SCRIPT_HEADERS)
+    for plan in render_plans.values():
+        needed_headers.update(plan.fields)
+    return needed_headers
 
 
-def gen_config_to_cell(ws_obj, config_templates, header_col_index):
-    """Utilize the a dictionary mapping key to a configuration template, cfg template
-    should be in str.format() method form for a dictionary.
-    Will ignore all columns before the header_col_index value.
-    Issues with adding the Configuration at the End of the Columns, A "Configuration
-    """
-    # Need the Header Name to Index Value Dictionary to identify locations of Headers
-    header_index = get_table_headers(ws_obj, True, header_col_index)
-    if "Configuration" not in header_index.keys():
-        print("Issue with this: ", ws_obj,
+def read_sheets(wb_obj, ignore_sheets, header_index, needed_headers=None):
+    """Reads every Device Sheet not being ignored into a SheetData, keyed by
+    Sheet Name. Only the needed headers are kept, all of them if None."""
+    sheets = {}
+    for sheetname in wb_obj.sheetnames:
+        if sheetname not in ignore_sheets:
+            sheets[sheetname] = Workbook.read_sheet(wb_obj[sheetname], header_index, needed_headers)
+    return sheets
+
+
+def gen_cfg_by_ws(sheets, render_plans, results, processes=1, fingerprints=None, exporter=None):
+    """Cycles through the Device Sheets, the worksheets in the ignore_sheets
+    list as defined in 'Settings' Sheet are not read in to begin with.
+    All the Sheets are checked for unknown templates or missing headers
+    before any configuration is generated. With more than one process the
+    Sheets are rendered in parallel, one Sheet per process at a time.
+    With fingerprints only the rows that changed since the last run are rendered.
+    With an exporter the configuration of each Sheet is written to its file."""
+    issues = []
+    for sheet in sheets.values():
+        if "Template" in sheet.headers and "Configuration" in sheet.headers:
+            template_names = [name for name in sheet.get_column("Template") if name]
+            issues += Render.find_template_issues(sheet.name, sheet.headers, render_plans, template_names)
+    if issues:
+        for issue in issues:
+            print(issue)
+        print("Exiting Now.")
+        sys.exit()
+    if processes > 1:
+        gen_cfg_parallel(sheets, render_plans, results, processes, fingerprints, exporter)
+    else:
+        for sheet in sheets.values():
+            gen_config_to_cell(sheet, render_plans, results, fingerprints, exporter)
+    if VERBOSE and fingerprints is not None:
+        print("Skipped", fingerprints.skipped, "rows that have not changed since the last run")
+    if VERBOSE and exporter is not None:
+        print("Exported", exporter.rows, "configurations to", exporter.files, "files in", exporter.export_dir)
+
+
+def has_config_header(sheet):
+    """Checks the Sheet has a 'Configuration' header, warns if it does not"""
+    if "Configuration" not in sheet.headers.keys():
+        print("Issue with this: ", sheet.name,
                 "\nThis Sheet needs to have a header named 'Configuration' defined in Row",
-                header_col_index, "\nThis is to ensure that the output is printed correctly.")
+                sheet.header_row, "\nThis is to ensure that the output is printed correctly.")
+        return False
+    return True
+
+
+def get_template_column(sheet, render_plans, fingerprints=None):
+    """Returns the Template column, without the unchanged rows if fingerprints is given"""
+    if fingerprints is None:
+        return sheet.get_column("Template")
+    return fingerprints.get_template_column(sheet, render_plans)
+
+
+def queue_configs(sheet, rendered, results, fingerprints=None, exporter=None):
+    """Queues the rendered (row position, configuration) pairs of a Sheet,
+    with an exporter they are written to the export file of the Sheet too"""
+    row_values = [(sheet.first_row+row_pos, cfg) for row_pos, cfg in rendered]
+    Trace.count("rows rendered", len(row_values))
+    if exporter is not None:
+        # The export file is written whole, the unchanged rows come from their Configuration cell
+        skipped = get_skipped_configs(sheet, rendered) if fingerprints is not None else []
+        exporter.write_sheet(sheet, row_values + skipped)
+    if exporter is None or not exporter.export_only:
+        results.write_column(sheet.name, sheet.headers["Configuration"], row_values)
+    if fingerprints is not None:
+        for row, cfg in row_values:
+            fingerprints.record(sheet.name, row, cfg)
+
+
+def get_skipped_configs(sheet, rendered):
+    """Returns the (row, configuration) pairs of the templated rows that were
+    not rendered again, their Configuration cell still holds the output"""
+    rendered_positions = {row_pos for row_pos, cfg in rendered}
+    config_column = sheet.get_column("Configuration")
+    return [(sheet.first_row+row_pos, config_column[row_pos] or "")
+            for row_pos, template_name in enumerate(sheet.get_column("Template"))
+            if template_name and row_pos not in rendered_positions]
+
+
+def gen_config_to_cell(sheet, render_plans, results, fingerprints=None, exporter=None):
+    """Utilize the a dictionary mapping key to a compiled configuration template,
+    the rows of a template are rendered together in one batch.
+    The Configuration is queued in results for the 'Configuration' column.
+    """
+    if not has_config_header(sheet):
         return
-    for row in ws_obj:
-        row_index = row[0].row
-        if row_index > header_col_index:
-            if row[header_index["Template"]-1].value:
-                # Ned the Row as a Dictionary to easily utilize the str.format() method
-                row_dict=gen_row_dict(row, header_index)
-                tmplt = config_templates[row[header_index["Template"]-1].value]
-                cfg = tmplt.format(**row_dict)
-                rw_cell(ws_obj, row_index, header_index["Configuration"], cfg)
-
-
-def get_table_headers(ws_obj, dict, index):
-    """returns the Table Headers, if dict is true it will return a dictionary with the index as the value and the header as the key
-    If you change the Column that it returns as the 'Headers'"""
-    if dict:
-        return_dict = {}
-        for cell in ws_obj[index]:
-            return_dict[cell.value] = cell.col_idx
-        return return_dict
-    else:
-        return_list
-        for cell in ws_obj[index]:
-            return_list.append(cell)
-        return return_list
+    with Trace.span("gen_config_to_cell", sheet=sheet.name) as trace_args:
+        template_column = get_template_column(sheet, render_plans, fingerprints)
+        rendered = Render.render_columns(render_plans, template_column, sheet.get_header_columns())
+        queue_configs(sheet, rendered, results, fingerprints, exporter)
+        trace_args["rows"] = len(rendered)
+
+
+def gen_cfg_parallel(sheets, render_plans, results, processes, fingerprints=None, exporter=None):
+    """Sends the templated rows of each Sheet to the worker processes as plain
+    tuples and queues the returned Configuration one Sheet at a time."""
+    jobs = []
+    for sheet in sheets.values():
+        if not has_config_header(sheet):
+            continue
+        template_column = get_template_column(sheet, render_plans, fingerprints)
+        row_positions = [row_pos for row_pos, name in enumerate(template_column) if name]
+        if row_positions:
+            headers = tuple(sheet.get_header_columns().keys())
+            jobs.append((sheet.name, headers, sheet.get_row_tuples(headers, row_positions)))
+        elif exporter is not None:
+            # Nothing changed, the export file is still written from the Configuration cells
+            queue_configs(sheet, [], results, fingerprints, exporter)
+    if not jobs:
+        return
+    if VERBOSE:
+        print("Generating configuration for", len(jobs), "sheets with", processes, "processes")
+    for sheetname, rendered in Render.render_sheets_parallel(jobs, render_plans, processes):
+        queue_configs(sheets[sheetname], rendered, results, fingerprints, exporter)
 
 
-def gen_row_dict(row, header_index):
-    """Takes a Row of cells and a header_index to generate a dictionary for that row"""
-    return_dict = {}
-    for header,col_index in header_index.items():
-        cell_value = row[col_index-1].value
-        if cell_value:
-            return_dict[header]=cell_value
-        else:
-            return_dict[header]=""
-    return return_dict
+def apply_results(wb_obj, results):
+    """Writes the queued results into the WorkBook"""
+    for sheetname, cells in results.items():
+        ws_obj = wb_obj[sheetname]
+        for (row, column), value in cells.items():
+            rw_cell(ws_obj, row, column, value)
 
 
 def save_xls(wb_obj, file_name, out_dir_path=Path("")):
@@ -171,33 +455,95 @@ def save_xls(wb_obj, file_name, out_dir_path=Path("")):
     file_save_string = out_dir_path
     file_save_string = file_save_string/file_name
     print("saving the file to:", file_save_string)
-    wb_obj.save(file_save_string)
-
-
-def read_device_information(wb_obj, ignore_sheets):
-    net_devices = []
-    for sheetname in wb_obj.sheetnames:
-        if sheetname not in ignore_sheets:
-            net_dev_info = {
-                "host":rw_cell(wb_obj[sheetname], 1, 2),
-                "username":rw_cell(wb_obj[sheetname], 2, 2),
-                "password":rw_cell(wb_obj[sheetname], 3, 2),
-                "secret":rw_cell(wb_obj[sheetname], 4, 2),
-                "device_type":rw_cell(wb_obj[sheetname], 5, 2),
-                "sheetname":sheetname
-            }
-            if None not in net_dev_info.values():
-                net_devices.append(Network.NetworkDevice(**net_dev_info))
-    return net_devices
-
-
-def check_net_dev_connection(net_dev, wb_obj, header_index):
-    ws_obj = wb_obj[net_dev.sheetname]
-    for row in range(header_index+1, ws_obj.max_row+1):
+    with Trace.span("save_xls"):
+        wb_obj.save(file_save_string)
+
+
+def save_results(wb_obj, results, input_file, file_name, write_only=False):
+    """Output stage, applies the results and saves the WorkBook. A streamed
+    WorkBook can not be written to, the input file is loaded to apply them.
+    With write_only the rows of the input file are streamed into a new
+    WorkBook instead, with the results applied on the way."""
+    if wb_obj is not None and wb_obj.read_only:
+        wb_obj.close()
+        wb_obj = None
+    if write_only:
+        print("saving the file to:", file_name)
+        with Trace.span("save_xls", write_only=True):
+            Workbook.save_streamed(input_file, file_name, results)
+        return
+    if wb_obj is None:
+        wb_obj = open_xls(Path(input_file))
+    apply_results(wb_obj, results)
+    save_xls(wb_obj, file_name)
+
+
+def get_device_key(net_dev_info):
+    """Devices with the same host, device type and credentials are collected once"""
+    return tuple(net_dev_info[field] for field in DEVICE_KEY_FIELDS)
+
+
+def get_discovery_cache(setup_args):
+    """Returns the DiscoveryCache asked for with the cache options, with the
+    hosts of '--invalidate_cache' removed, None if not used"""
+    if not (setup_args["cache"] or setup_args["refresh_cache"] or setup_args["invalidate_cache"]):
+        return None
+    discovery_cache = DiscoveryCache.DiscoveryCache(ttl=setup_args["cache_ttl"], refresh=setup_args["refresh_cache"])
+    for host in setup_args["invalidate_cache"]:
+        discovery_cache.invalidate(host)
+    return discovery_cache
+
+
+def get_session_log_writer(setup_args):
+    """Returns the SessionLogWriter asked for with '--session_logs', None if not"""
+    if not setup_args["session_logs"]:
+        return None
+    return SessionLog.SessionLogWriter(setup_args["log_dir"], setup_args["log_max_mb"] * 1024 * 1024,
+                                       compress=setup_args["log_compress"])
+
+
+def read_device_information(sheets, discovery_cache=None, replay=None, session_pool=None, ssh_port=None,
+                            session_log=None):
+    """Plans the collection, Sheets pointing at the same device with the same
+    credentials share a single NetworkDevice, listed in its sheetnames.
+    With a session_pool the SSH sessions are kept open after the collection,
+    ssh_port replaces port 22 for every device and with a session_log writer
+    the raw output of every session is logged."""
+    load_network_modules()
+    net_devices = {}
+    for sheetname, sheet in sheets.items():
+        net_dev_info = {
+            "host":sheet.get_meta(1, 2),
+            "username":sheet.get_meta(2, 2),
+            "password":sheet.get_meta(3, 2),
+            "secret":sheet.get_meta(4, 2),
+            "device_type":sheet.get_meta(5, 2),
+            "sheetname":sheetname
+        }
+        if None not in net_dev_info.values():
+            device_key = get_device_key(net_dev_info)
+            if device_key in net_devices:
+                net_devices[device_key].sheetnames.append(sheetname)
+                if VERBOSE:
+                    print(net_dev_info["host"], "| Sheet", sheetname, "shares the device of Sheet",
+                          net_devices[device_key].sheetname)
+            else:
+                net_devices[device_key] = Network.NetworkDevice(discovery_cache=discovery_cache, replay=replay,
+                                                                session_pool=session_pool, port=ssh_port,
+                                                                session_log=session_log,
+                                                                **net_dev_info)
+    return list(net_devices.values())
+
+
+def check_net_dev_connection(net_dev, sheet, results):
+    """Verifies each row of the device sheet against the CDP and LLDP neighbors
+    Returns the list of row numbers that did not match any neighbor"""
+    unmatched_rows = []
+    for row in sheet.rows():
         neigh_info={
-            "local_interface":rw_cell(ws_obj, row, 1),
-            "neighbor":rw_cell(ws_obj, row, 2),
-            "remote_interface":rw_cell(ws_obj, row, 3)
+            "local_interface":sheet.get_value(1, row),
+            "neighbor":sheet.get_value(2, row),
+            "remote_interface":sheet.get_value(3, row)
         }
         dict_values = neigh_info.values()
         if None not in dict_values and "" not in dict_values:
@@ -210,35 +556,360 @@ def check_net_dev_connection(net_dev, wb_obj, header_index):
             if response:
                 connection_status += response
             if connection_status:
-                rw_cell(ws_obj, row, 4, connection_status)
-
-
-def update_discovered_data(net_dev, wb_obj):
-    ws_obj = wb_obj[net_dev.sheetname]
-    if net_dev.status == "Complete":
-        rw_cell(ws_obj, 1, 4, net_dev.hostname)
-        rw_cell(ws_obj, 2, 4, net_dev.version)
-        if isinstance(net_dev.model, list):
-            rw_cell(ws_obj, 3, 4, ",".join(net_dev.model))
-        else:
-            rw_cell(ws_obj, 3, 4, net_dev.model)
-        if isinstance(net_dev.serial_number, list):
-            rw_cell(ws_obj, 4, 4, ",".join(net_dev.serial_number))
+                results.write(sheet.name, row, 4, connection_status)
+            else:
+                unmatched_rows.append(row)
+    if VERBOSE and unmatched_rows:
+        print(net_dev.host, "|", sheet.name, "| Rows not matched via CDP or LLDP:", unmatched_rows)
+    return unmatched_rows
+
+
+def update_discovered_data(net_dev, results):
+    """Writes the discovered data to every Sheet of the device, with the
+    number of attempts next to the Status when it took more than one.
+    Otherwise that cell is erased, it may hold the count of an older run."""
+    for sheetname in net_dev.sheetnames:
+        if net_dev.status == "Complete":
+            results.write(sheetname, 1, 4, net_dev.hostname)
+            results.write(sheetname, 2, 4, net_dev.version)
+            if isinstance(net_dev.model, list):
+                results.write(sheetname, 3, 4, ",".join(net_dev.model))
+            else:
+                results.write(sheetname, 3, 4, net_dev.model)
+            if isinstance(net_dev.serial_number, list):
+                results.write(sheetname, 4, 4, ",".join(net_dev.serial_number))
+            else:
+                results.write(sheetname, 4, 4, net_dev.serial_number)
+            results.write(sheetname, 5, 4, net_dev.boot_image)
+        results.write(sheetname, 6, 2, net_dev.status)
+        if net_dev.attempts > 1:
+            results.write(sheetname, 6, 3, "{} attempts".format(net_dev.attempts))
         else:
-            rw_cell(ws_obj, 4, 4, net_dev.serial_number)
-        rw_cell(ws_obj, 5, 4, net_dev.boot_image)
-    rw_cell(ws_obj, 6, 2, net_dev.status)
+            results.write(sheetname, 6, 3, "")
 
 
-def check_all_devices_connections(wb_obj, ignore_sheets, header_index):
-    # Gatheres the Devices and connects to them and logs all the data from them.
-    net_devices = read_device_information(wb_obj, ignore_sheets)
-    #print(net_devices)
+def verify_topology(sheets, net_devices, results):
+    """Checks every row against both ends of its link in one pass, the
+    Connection Status is Verified, One-sided, Mismatched or Missing.
+    The rows not verified are kept in unmatched_rows of each device."""
+    topology = Topology.Topology()
     for net_dev in net_devices:
         if net_dev.status == "Data Gathered":
-            interfaces = check_net_dev_connection(net_dev, wb_obj, header_index)
+            topology.add_neighbors(net_dev.hostname, net_dev.cdp_neighbors, "CDP")
+            topology.add_neighbors(net_dev.hostname, net_dev.lldp_neighbors, "LLDP")
+    owners = {}
+    for net_dev in net_devices:
+        for sheetname in net_dev.sheetnames:
+            topology.add_sheet(net_dev.hostname or sheetname, sheets[sheetname])
+            owners[sheetname] = net_dev
+            net_dev.unmatched_rows[sheetname] = []
+    counts = {}
+    for sheetname, row, status, text in topology.reconcile():
+        results.write(sheetname, row, 4, status + "\n" + text if status != Topology.VERIFIED else text)
+        counts[status] = counts.get(status, 0) + 1
+        if status != Topology.VERIFIED:
+            owners[sheetname].unmatched_rows[sheetname].append(row)
+    if VERBOSE:
+        print("Topology check:", ", ".join("{} {}".format(count, status) for status, count in counts.items()))
+
+
+def probe_net_devices(net_devices, probe_timeout):
+    """Pre-flight check of the SSH port of the devices that need a login.
+    Devices that do not answer are marked 'Unreachable' right away.
+    Returns the list of live devices and the list of unreachable devices."""
+    to_probe = [net_dev for net_dev in net_devices if net_dev.needs_connection()]
+    reachable = Reachability.probe_targets([(net_dev.host, net_dev.port) for net_dev in to_probe],
+                                           timeout=probe_timeout)
+    live_devices = []
+    unreachable = []
+    for net_dev in net_devices:
+        if reachable.get((net_dev.host, net_dev.port), True):
+            live_devices.append(net_dev)
+        else:
+            print("{} | Port {} did not answer, skipping the device.".format(net_dev.host, net_dev.port))
+            net_dev.add_cmnt_msg("Port {} did not answer within {} seconds".format(
+                net_dev.port, probe_timeout), "Error")
+            net_dev.status = "Unreachable"
+            unreachable.append(net_dev)
+    return live_devices, unreachable
+
+
+def collect_net_devices(net_devices,
+                        workers=Collector.DEFAULT_WORKERS,
+                        timeout=Collector.DEFAULT_TIMEOUT,
+                        backend="thread",
+                        preload_templates=False,
+                        probe_timeout=None,
+                        attempts=Collector.DEFAULT_ATTEMPTS,
+                        retry_backoff=Collector.DEFAULT_BACKOFF):
+    """Collects the devices in parallel, yields each NetworkDevice once it is
+    done. The devices that did not answer the probe are yielded first, they
+    are not retried."""
+    if preload_templates:
+        device_types = set(net_dev.device_type for net_dev in net_devices)
+        Parsers.get_registry().warm_up(device_types, Network.GATHER_CMDS)
+    if probe_timeout:
+        net_devices, unreachable = probe_net_devices(net_devices, probe_timeout)
+        yield from unreachable
+    if backend == "async":
+        yield from Collector.collect_devices_async(net_devices, workers, timeout, attempts, retry_backoff)
+    else:
+        yield from Collector.collect_devices(net_devices, workers, timeout, attempts, retry_backoff)
+
+
+def verify_net_devices(sheets, net_devices, results, topology=False):
+    """Verifies the Sheets of the collected devices and queues their discovered
+    data. With topology all the devices are verified together in one pass.
+    Returns the list of devices."""
+    if topology:
+        with Trace.span("verify_topology"):
+            verify_topology(sheets, net_devices, results)
+        for net_dev in net_devices:
+            if net_dev.status == "Data Gathered":
+                net_dev.status = "Complete"
+            update_discovered_data(net_dev, results)
+        return list(net_devices)
+    verified = []
+    for net_dev in net_devices:
+        if net_dev.status == "Data Gathered":
+            with Trace.span("verify", net_dev.host):
+                for sheetname in net_dev.sheetnames:
+                    net_dev.unmatched_rows[sheetname] = check_net_dev_connection(net_dev, sheets[sheetname], results)
             net_dev.status = "Complete"
-        update_discovered_data(net_dev, wb_obj)
+        update_discovered_data(net_dev, results)
+        verified.append(net_dev)
+    return verified
+
+
+def get_link_results(sheets, net_devices, results):
+    """Returns the outcome of every row of the checked Sheets for the results
+    store: (host, sheet, row, local interface, neighbor, remote interface,
+    status, detail). The status of a row that did not match is the first
+    line of its Connection Status, or the status of a device not collected."""
+    links = []
+    for net_dev in net_devices:
+        for sheetname in net_dev.sheetnames:
+            sheet = sheets[sheetname]
+            unmatched = set(net_dev.unmatched_rows.get(sheetname, ()))
+            for row in sheet.rows():
+                values = [sheet.get_value(column, row) for column in (1, 2, 3)]
+                if None in values or "" in values:
+                    continue
+                detail = results.get(sheetname, row, 4) or ""
+                if row in unmatched:
+                    status = detail.split("\n")[0] if detail else ResultStore.NOT_VERIFIED
+                elif net_dev.status == "Complete":
+                    status = ResultStore.VERIFIED
+                else:
+                    status = net_dev.status
+                links.append((str(net_dev.host), sheetname, row) + tuple(str(value) for value in values)
+                             + (status, detail))
+    return links
+
+
+def store_check_results(store, workbook, sheets, net_devices, results):
+    """Records the devices and the row outcomes of a WorkBook in the results store"""
+    with Trace.span("store_results"):
+        store.add_devices(workbook, net_devices)
+        store.add_links(workbook, get_link_results(sheets, net_devices, results))
+
+
+def check_all_devices_connections(sheets, results,
+                                  workers=Collector.DEFAULT_WORKERS,
+                                  timeout=Collector.DEFAULT_TIMEOUT,
+                                  backend="thread",
+                                  discovery_cache=None,
+                                  replay=None,
+                                  preload_templates=False,
+                                  probe_timeout=None,
+                                  topology=False,
+                                  attempts=Collector.DEFAULT_ATTEMPTS,
+                                  retry_backoff=Collector.DEFAULT_BACKOFF,
+                                  session_log=None):
+    # Gatheres the Devices and connects to them and logs all the data from them.
+    # Collection runs in parallel, the results are only queued from this thread.
+    # Returns the list of devices.
+    net_devices = read_device_information(sheets, discovery_cache, replay, session_log=session_log)
+    collected = collect_net_devices(net_devices, workers, timeout, backend, preload_templates, probe_timeout,
+                                    attempts, retry_backoff)
+    if topology:
+        # Every device has to be collected before either end of a link is checked
+        collected = list(collected)
+    return verify_net_devices(sheets, collected, results, topology)
+
+
+def find_batch_files(pattern):
+    """Returns the WorkBooks in a directory, or matching a glob"""
+    if Path(pattern).is_dir():
+        files = Path(pattern).glob("*.xlsx")
+    else:
+        files = (Path(file_name) for file_name in glob.glob(pattern))
+    # Skips the lock files Excel leaves next to an open WorkBook
+    return sorted(file for file in files if not file.name.startswith("~$"))
+
+
+def read_batch_workbook(input_file, header_index):
+    """Worker process, reads the templates and the Sheets of a WorkBook.
+    Returns the templates, the Sheets and the seconds it took."""
+    start = time.perf_counter()
+    wb_obj = open_xls(Path(input_file), True)
+    config_templates = get_config_templates(wb_obj["Settings"])
+    render_plans = Render.compile_templates(config_templates)
+    ignore_sheets = get_ignore_sheets(wb_obj["Settings"])
+    sheets = read_sheets(wb_obj, ignore_sheets, header_index, get_needed_headers(render_plans))
+    wb_obj.close()
+    return config_templates, sheets, time.perf_counter() - start
+
+
+def save_batch_workbook(input_file, output_file, results, write_only=False):
+    """Worker process, applies the results to a WorkBook and saves it.
+    Returns the seconds it took."""
+    start = time.perf_counter()
+    save_results(None, results, input_file, output_file, write_only)
+    return time.perf_counter() - start
+
+
+def run_batch_step(job, step, *args):
+    """Runs a step of a batch WorkBook, a failure or exit is recorded on the
+    job so the other WorkBooks carry on."""
+    try:
+        step(*args)
+    except (Exception, SystemExit) as e:
+        job["error"] = "{}: {}".format(type(e).__name__, e)
+        print(job["input_file"], "| Failed.", job["error"])
+
+
+def check_batch_connections(batch, setup_args, discovery_cache, replay):
+    """Collects every device of the batch once, a device listed in several
+    WorkBooks is shared by them, then verifies each WorkBook's own Sheets.
+    Returns the seconds the collection took."""
+    collected = {}
+    session_log = get_session_log_writer(setup_args)
+    for job in batch:
+        job["net_devices"] = read_device_information(job["sheets"], discovery_cache, replay,
+                                                     session_log=session_log)
+        for net_dev in job["net_devices"]:
+            collected.setdefault(get_device_key(vars(net_dev)), net_dev)
+    if VERBOSE:
+        print("Collecting", len(collected), "devices for", len(batch), "WorkBooks")
+    start = time.perf_counter()
+    for net_dev in collect_net_devices(list(collected.values()),
+                                       setup_args["workers"], setup_args["timeout"],
+                                       setup_args["backend"], setup_args["preload_templates"],
+                                       setup_args["probe_timeout"] if setup_args["probe"] else None,
+                                       setup_args["attempts"], setup_args["retry_backoff"]):
+        pass
+    collection_time = time.perf_counter() - start
+    if session_log is not None:
+        session_log.close()
+    # Shared devices get the data of the collected copy before any is verified
+    for job in batch:
+        for net_dev in job["net_devices"]:
+            shared = collected[get_device_key(vars(net_dev))]
+            if net_dev is not shared:
+                net_dev.copy_collection(shared)
+    for job in batch:
+        start = time.perf_counter()
+        run_batch_step(job, verify_net_devices, job["sheets"], job["net_devices"], job["results"],
+                       setup_args["topology"])
+        job["timings"]["verify"] = time.perf_counter() - start
+    return collection_time
+
+
+def generate_batch_config(job, setup_args):
+    """Generates the configuration of a batch WorkBook"""
+    fingerprints = None
+    if setup_args["incremental"]:
+        fingerprints = Incremental.FingerprintCache(Incremental.get_sidecar_path(job["input_file"]))
+    render_plans = Render.compile_templates(job["templates"])
+    exporter = None
+    if setup_args["export_dir"]:
+        # Each WorkBook gets its own directory, Sheet names repeat across sites
+        exporter = Export.ConfigExporter(Path(setup_args["export_dir"])/job["input_file"].stem,
+                                         setup_args["export_only"])
+    gen_cfg_by_ws(job["sheets"], render_plans, job["results"], setup_args["processes"], fingerprints, exporter)
+    job["fingerprints"] = fingerprints
+
+
+def print_batch_summary(batch, collection_time):
+    """Prints the timings and the failures of every WorkBook"""
+    steps = ["read", "verify", "generate", "save"]
+    print("Batch summary:")
+    print("  {:<40}".format("WorkBook") + "".join("{:>10}".format(step) for step in steps))
+    for job in batch:
+        line = "  {:<40}".format(job["input_file"].name)
+        line += "".join("{:>10}".format("{:.3f}".format(job["timings"][step]) if step in job["timings"] else "-")
+                        for step in steps)
+        print(line + ("  " + job["error"] if job["error"] else ""))
+    if collection_time is not None:
+        print("  Shared device collection: {:.3f}s".format(collection_time))
+    failed = [job for job in batch if job["error"]]
+    print("  {} WorkBooks, {} failed".format(len(batch), len(failed)))
+
+
+def run_batch(setup_args, header_index, store=None):
+    """Runs the selected phases over every WorkBook of the batch. The
+    WorkBooks are read and saved in parallel, one process per core, and the
+    devices are collected together."""
+    files = find_batch_files(setup_args["batch"])
+    if not files:
+        print("No WorkBooks found for:", setup_args["batch"])
+        print("Exiting Now.")
+        sys.exit()
+    out_dir = Path(setup_args["output_file"]) if setup_args["output_file"] else None
+    if out_dir is not None:
+        out_dir.mkdir(parents=True, exist_ok=True)
+    batch = [{"input_file": file, "output_file": out_dir/file.name if out_dir else file,
+              "results": Workbook.ResultWriter(), "timings": {}, "error": None} for file in files]
+    processes = min(len(batch), os.cpu_count() or 1)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as pool:
+        with Trace.span("open_xls", workbooks=len(batch)):
+            futures = [pool.submit(read_batch_workbook, job["input_file"], header_index) for job in batch]
+            for job, future in zip(batch, futures):
+                try:
+                    job["templates"], job["sheets"], job["timings"]["read"] = future.result()
+                except (Exception, SystemExit) as e:
+                    job["error"] = "{}: {}".format(type(e).__name__, e)
+        loaded = [job for job in batch if not job["error"]]
+
+        collection_time = None
+        if setup_args["check_connections"] and loaded:
+            load_network_modules()
+            if setup_args["timing_file"]:
+                Network.load_timing_settings(setup_args["timing_file"])
+            discovery_cache = get_discovery_cache(setup_args)
+            replay = Replay.ReplaySource(setup_args["replay"]) if setup_args["replay"] else None
+            with Trace.span("check_connections"):
+                collection_time = check_batch_connections(loaded, setup_args, discovery_cache, replay)
+            if store is not None:
+                for job in loaded:
+                    if not job["error"]:
+                        store_check_results(store, job["input_file"].name, job["sheets"], job["net_devices"],
+                                            job["results"])
+
+        if setup_args["generate_config"]:
+            with Trace.span("generate_config"):
+                for job in loaded:
+                    if not job["error"]:
+                        start = time.perf_counter()
+                        run_batch_step(job, generate_batch_config, job, setup_args)
+                        job["timings"]["generate"] = time.perf_counter() - start
+
+        to_save = [job for job in loaded if not job["error"]
+                   and (job["results"].count() or not setup_args["export_only"])]
+        with Trace.span("save_xls", workbooks=len(to_save)):
+            futures = [pool.submit(save_batch_workbook, job["input_file"], job["output_file"], job["results"],
+                                   setup_args["write_only"])
+                       for job in to_save]
+            for job, future in zip(to_save, futures):
+                try:
+                    job["timings"]["save"] = future.result()
+                except (Exception, SystemExit) as e:
+                    job["error"] = "{}: {}".format(type(e).__name__, e)
+                    continue
+                if job.get("fingerprints") is not None:
+                    job["fingerprints"].save(Incremental.get_sidecar_path(job["output_file"]))
+    print_batch_summary(batch, collection_time)
 
 
 ###### MAIN ######
@@ -249,24 +920,93 @@ def main():
     if setup_args["verbose"] == True:
         global VERBOSE
         VERBOSE = True
-        Network.VERBOSE = True
-
-    wb_obj = open_xls(Path(setup_args["input_file"]))
-
-    config_templates = get_config_templates(wb_obj["Settings"])
-    ignore_sheets = get_ignore_sheets(wb_obj["Settings"])
+        Collector.VERBOSE = True
+        DiscoveryCache.VERBOSE = True
+        Reachability.VERBOSE = True
+        ResultStore.VERBOSE = True
+    # The timings are recorded for the trace file, the results store and the verbose summary
+    Trace.ENABLED = VERBOSE or bool(setup_args["trace"]) or bool(setup_args["results_db"])
+    store = None
+    if setup_args["results_db"]:
+        store = ResultStore.ResultStore(setup_args["results_db"])
+        store.start_run(setup_args["batch"] or setup_args["input_file"], " ".join(sys.argv[1:]))
+    with Trace.span("main"):
+        if setup_args["batch"]:
+            run_batch(setup_args, header_index, store)
+        else:
+            run(setup_args, header_index, store)
+    if store is not None:
+        store.add_timings(Trace.get_phase_totals())
+        store.finish_run()
+        store.close()
+        print("Results recorded as run", store.run_id, "in:", setup_args["results_db"])
+    if setup_args["trace"]:
+        Trace.save(setup_args["trace"])
+        print("Timing trace saved to:", setup_args["trace"])
+    if VERBOSE:
+        Trace.print_summary()
+
+
+def run(setup_args, header_index, store=None):
+    """Runs the phases selected by the CLI options, the check results are
+    recorded in the store if given"""
+    with Trace.span("open_xls"):
+        wb_obj = open_xls(Path(setup_args["input_file"]), setup_args["stream"])
+        config_templates = get_config_templates(wb_obj["Settings"])
+        render_plans = Render.compile_templates(config_templates)
+        ignore_sheets = get_ignore_sheets(wb_obj["Settings"])
+        sheets = read_sheets(wb_obj, ignore_sheets, header_index, get_needed_headers(render_plans))
+    results = Workbook.ResultWriter()
+    discovery_cache = get_discovery_cache(setup_args)
     if setup_args["check_connections"]:
-        check_all_devices_connections(wb_obj, ignore_sheets, header_index)
-
+        load_network_modules()
+        if setup_args["timing_file"]:
+            Network.load_timing_settings(setup_args["timing_file"])
+        replay = None
+        if setup_args["replay"]:
+            replay = Replay.ReplaySource(setup_args["replay"])
+        session_log = get_session_log_writer(setup_args)
+        with Trace.span("check_connections"):
+            net_devices = check_all_devices_connections(sheets, results,
+                                          setup_args["workers"], setup_args["timeout"],
+                                          setup_args["backend"], discovery_cache, replay,
+                                          setup_args["preload_templates"],
+                                          setup_args["probe_timeout"] if setup_args["probe"] else None,
+                                          setup_args["topology"],
+                                          setup_args["attempts"], setup_args["retry_backoff"],
+                                          session_log)
+        if session_log is not None:
+            session_log.close()
+        if store is not None:
+            store_check_results(store, Path(setup_args["input_file"]).name, sheets, net_devices, results)
+
+    fingerprints = None
     if setup_args["generate_config"]:
-        gen_cfg_by_ws(wb_obj, config_templates,ignore_sheets, header_index)
+        if setup_args["incremental"]:
+            fingerprints = Incremental.FingerprintCache(Incremental.get_sidecar_path(setup_args["input_file"]))
+        exporter = None
+        if setup_args["export_dir"]:
+            exporter = Export.ConfigExporter(setup_args["export_dir"], setup_args["export_only"])
+        with Trace.span("generate_config"):
+            gen_cfg_by_ws(sheets, render_plans, results, setup_args["processes"], fingerprints, exporter)
+    if setup_args["export_only"] and not results.count():
+        print("Nothing to write to the WorkBook, it is not saved.")
+        return
     # Save Configuration
     if setup_args["output_file"]:
         setup_args["output_file"] = add_xls_tag(setup_args["output_file"])
-        save_xls(wb_obj, setup_args["output_file"])
+        save_results(wb_obj, results, setup_args["input_file"], setup_args["output_file"],
+                     setup_args["write_only"])
     else:
-        save_xls(wb_obj, setup_args["input_file"])
+        setup_args["output_file"] = setup_args["input_file"]
+        save_results(wb_obj, results, setup_args["input_file"], setup_args["output_file"],
+                     setup_args["write_only"])
+    # The fingerprints describe the saved WorkBook, kept next to it
+    if fingerprints is not None:
+        fingerprints.save(Incremental.get_sidecar_path(setup_args["output_file"]))
 
 
 if __name__ == "__main__":
+    # Needed for the generation worker processes when frozen into an .EXE
+    multiprocessing.freeze_support()
     main()
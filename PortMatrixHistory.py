@@ -0,0 +1,79 @@
+"""
+Port Matrix History
+Queries the results database written by PortMatrixHelper.py --results_db:
+the latest runs, the links that failed and what changed between two runs.
+"""
+import optparse
+import sys
+from pathlib import Path
+import Network.ResultStore as ResultStore
+
+
+def cli_args():
+    """Reads the CLI options provided and returns them as a dictionary"""
+    parser = optparse.OptionParser()
+    parser.add_option('-d','--db', dest="db", default=ResultStore.DEFAULT_DB, action="store",
+                      help="Results database written with '--results_db'.")
+    parser.add_option('--runs', dest="runs", default=False, action="store_true",
+                      help="List the latest runs.")
+    parser.add_option('--limit', dest="limit", default=20, type="int", action="store",
+                      help="Number of runs listed with '--runs'.")
+    parser.add_option('--failed', dest="failed", default=False, action="store_true",
+                      help="List the links that were not verified.")
+    parser.add_option('--since', dest="since", action="store",
+                      help="With '--failed' only the runs started on or after this date, i.e. 2024-05-01.")
+    parser.add_option('--host', dest="host", action="store",
+                      help="With '--failed' only the links of this host.")
+    parser.add_option('--compare', dest="compare", nargs=2, type="int", action="store",
+                      help="List the links whose outcome changed between two run ids, i.e. '--compare 4 7'.")
+    options, remainder = parser.parse_args()
+    return vars(options)
+
+
+def print_runs(store, limit):
+    """Prints the latest runs"""
+    print("{:>6}  {:<20}{:>8}{:>10}  {}".format("Run", "Started", "Links", "Verified", "WorkBook"))
+    for run in store.get_runs(limit):
+        print("{:>6}  {:<20}{:>8}{:>10}  {}".format(run["run_id"], run["started"], run["links"],
+                                                     run["verified"] or 0, run["workbook"]))
+
+
+def print_failed(store, since, host):
+    """Prints the links that were not verified"""
+    rows = store.get_failed_links(since, host)
+    for link in rows:
+        print("Run {} {} | {} | {} row {} | {} -> {} {} | {}".format(
+            link["run_id"], link["started"], link["workbook"], link["sheet"], link["row"],
+            link["local_interface"], link["neighbor"], link["remote_interface"], link["status"]))
+    print(len(rows), "links not verified")
+
+
+def print_compare(store, old_run, new_run):
+    """Prints the links whose outcome changed between two runs"""
+    rows = store.compare_runs(old_run, new_run)
+    for link in rows:
+        print("{} | {} | {} -> {} {} | {} -> {}".format(
+            link["workbook"], link["sheet"], link["local_interface"], link["neighbor"],
+            link["remote_interface"], link["old_status"] or "-", link["new_status"] or "-"))
+    print(len(rows), "links changed between run", old_run, "and run", new_run)
+
+
+###### MAIN ######
+def main():
+    setup = cli_args()
+    if not Path(setup["db"]).exists():
+        print("The following file does not exists:", setup["db"])
+        print("Exiting Now.")
+        sys.exit()
+    store = ResultStore.ResultStore(setup["db"])
+    if setup["failed"]:
+        print_failed(store, setup["since"], setup["host"])
+    elif setup["compare"]:
+        print_compare(store, *setup["compare"])
+    else:
+        print_runs(store, setup["limit"])
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
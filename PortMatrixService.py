@@ -0,0 +1,307 @@
+"""
+Port Matrix Service
+Keeps a WorkBook loaded and the SSH sessions of its devices open, and answers
+requests over HTTP on localhost, so regenerating the configuration or
+re-verifying a Sheet does not pay for opening the WorkBook, compiling the
+templates and logging in to the devices every time.
+
+    GET  /sheets                  Device Sheets of the WorkBook
+    GET  /status                  WorkBook, queued results and session pool
+    POST /generate?sheet=NAME     Configuration of every row of the Sheet
+    POST /verify?sheet=NAME       Collects the device and verifies the Sheet
+    POST /save                    Saves the queued results to the output WorkBook
+    POST /reload                  Reads the WorkBook again
+
+Without a sheet, /generate and /verify run for every Device Sheet. The
+WorkBook is read again on its own when the file changes on disk.
+"""
+import optparse
+import json
+import threading
+import time
+from pathlib import Path
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+import PortMatrixHelper
+import Network.Collector as Collector
+import Network.SessionPool as SessionPool
+import Network.SessionLog as SessionLog
+import Matrix.Workbook as Workbook
+import Matrix.Render as Render
+
+VERBOSE = False
+
+DEFAULT_PORT = 8750
+LOCAL_ADDRESSES = ["127.0.0.1", "localhost", "::1"]
+HEADER_INDEX = 9
+
+
+def cli_args():
+    """Reads the CLI options provided and returns them as a dictionary"""
+    parser = optparse.OptionParser()
+    parser.add_option('-v','--verbose', dest="verbose", default=False, action="store_true",
+                      help="Prints more output for debugging.")
+    parser.add_option('-i','--input_file', dest="input_file", default="PortMatrix.xlsx", action="store",
+                      help="The WorkBook kept loaded by the service.")
+    parser.add_option('-o','--output', dest="output_file", action="store",
+                      help="WorkBook written by '/save', the input WorkBook if not given.")
+    parser.add_option('--bind', dest="bind", default="127.0.0.1", action="store",
+                      help="Address the service listens on. The service has no authentication, only listen on another address than 127.0.0.1 on a trusted network.")
+    parser.add_option('--port', dest="port", default=DEFAULT_PORT, type="int", action="store",
+                      help="TCP port the service listens on.")
+    parser.add_option('--idle_timeout', dest="idle_timeout", default=SessionPool.DEFAULT_IDLE_TIMEOUT,
+                      type="int", action="store",
+                      help="Seconds an SSH session is kept open without being used.")
+    parser.add_option('--max_sessions', dest="max_sessions", default=SessionPool.DEFAULT_MAX_SESSIONS,
+                      type="int", action="store",
+                      help="Number of idle SSH sessions kept open.")
+    parser.add_option('--ssh_port', dest="ssh_port", type="int", action="store",
+                      help="SSH port of every device instead of 22, i.e. for a local test server.")
+    parser.add_option('--session_logs', dest="session_logs", default=False, action="store_true",
+                      help="Write the raw CLI output of every session to '<log_dir>/<host>_raw_cli.log'.")
+    parser.add_option('--log_dir', dest="log_dir", default=SessionLog.LOG_DIR, action="store",
+                      help="Directory of the session logs.")
+    parser.add_option('--log_compress', dest="log_compress", default=False, action="store_true",
+                      help="Gzip the rotated session logs.")
+    parser.add_option('-w','--workers', dest="workers", default=Collector.DEFAULT_WORKERS, type="int",
+                      action="store", help="Number of devices collected at the same time.")
+    parser.add_option('-t','--timeout', dest="timeout", default=Collector.DEFAULT_TIMEOUT, type="int",
+                      action="store", help="Seconds a device collection may take before it is marked as 'Timeout'.")
+    options, remainder = parser.parse_args()
+    return vars(options)
+
+
+class WorkBookState:
+    """
+    The parsed WorkBook: the compiled templates, the Device Sheets and the
+    results queued since the last save. The requests read the Sheets without
+    a lock, a reload swaps them in one assignment.
+    """
+
+    def __init__(self, input_file, output_file, session_pool, setup_args, session_log=None):
+        self.input_file = Path(input_file)
+        self.output_file = output_file or str(input_file)
+        self.session_pool = session_pool
+        self.session_log = session_log
+        self.setup_args = setup_args
+        self.lock = threading.Lock()
+        self.results = Workbook.ResultWriter()
+        self.loaded = None
+        self.mtime = None
+        self.load()
+
+
+    def load(self):
+        """Reads the Settings and the Device Sheets of the WorkBook"""
+        mtime = self.input_file.stat().st_mtime
+        wb_obj = PortMatrixHelper.open_xls(self.input_file, read_only=True)
+        config_templates = PortMatrixHelper.get_config_templates(wb_obj["Settings"])
+        render_plans = Render.compile_templates(config_templates)
+        ignore_sheets = PortMatrixHelper.get_ignore_sheets(wb_obj["Settings"])
+        sheets = PortMatrixHelper.read_sheets(wb_obj, ignore_sheets, HEADER_INDEX,
+                                              PortMatrixHelper.get_needed_headers(render_plans))
+        wb_obj.close()
+        self.loaded = (render_plans, sheets)
+        self.mtime = mtime
+        if VERBOSE:
+            print("Loaded", len(sheets), "sheets from", self.input_file)
+
+
+    def refresh(self):
+        """Reads the WorkBook again if it changed on disk, the queued results
+        belong to the old WorkBook and are dropped"""
+        if self.input_file.stat().st_mtime != self.mtime:
+            with self.lock:
+                if self.input_file.stat().st_mtime != self.mtime:
+                    self.load()
+                    self.results.clear()
+        return self.loaded
+
+
+    def get_sheets(self, sheets, sheetname):
+        """Returns the requested Sheet, or every Sheet when none is given"""
+        if sheetname is None:
+            return sheets
+        if sheetname not in sheets:
+            raise KeyError("No Device Sheet named '{}'".format(sheetname))
+        return {sheetname: sheets[sheetname]}
+
+
+    def generate(self, sheetname=None):
+        """Renders the Sheets and queues their configuration.
+        Returns {sheet: {row: configuration}}"""
+        render_plans, sheets = self.refresh()
+        sheets = self.get_sheets(sheets, sheetname)
+        issues = []
+        for sheet in sheets.values():
+            if "Template" in sheet.headers and "Configuration" in sheet.headers:
+                template_names = [name for name in sheet.get_column("Template") if name]
+                issues += Render.find_template_issues(sheet.name, sheet.headers, render_plans, template_names)
+        if issues:
+            raise ValueError("\n".join(issues))
+        results = Workbook.ResultWriter()
+        for sheet in sheets.values():
+            PortMatrixHelper.gen_config_to_cell(sheet, render_plans, results)
+        with self.lock:
+            self.results.update(results)
+        return {name: {row: value for (row, column), value in cells.items()} for name, cells in results.items()}
+
+
+    def verify(self, sheetname=None):
+        """Collects the devices of the Sheets over the pooled sessions and
+        verifies their rows. Returns {sheet: {"status", "hostname", "rows"}}"""
+        render_plans, sheets = self.refresh()
+        sheets = self.get_sheets(sheets, sheetname)
+        results = Workbook.ResultWriter()
+        net_devices = PortMatrixHelper.read_device_information(sheets, session_pool=self.session_pool,
+                                                               ssh_port=self.setup_args["ssh_port"],
+                                                               session_log=self.session_log)
+        collected = PortMatrixHelper.collect_net_devices(net_devices, self.setup_args["workers"],
+                                                         self.setup_args["timeout"])
+        net_devices = PortMatrixHelper.verify_net_devices(sheets, collected, results)
+        with self.lock:
+            self.results.update(results)
+        answer = {}
+        for net_dev in net_devices:
+            for name in net_dev.sheetnames:
+                rows = {row: value for (row, column), value in results.writes.get(name, {}).items()
+                        if column == 4 and row > sheets[name].header_row}
+                answer[name] = {"status": net_dev.status, "hostname": net_dev.hostname,
+                                "unmatched_rows": net_dev.unmatched_rows.get(name, []), "rows": rows}
+        return answer
+
+
+    def save(self):
+        """Saves the queued results to the output WorkBook"""
+        with self.lock:
+            PortMatrixHelper.save_results(None, self.results, self.input_file, self.output_file)
+            count = self.results.count()
+            self.results.clear()
+            if Path(self.output_file).resolve() == self.input_file.resolve():
+                # The saved WorkBook is the one loaded, no need to read it again
+                self.mtime = self.input_file.stat().st_mtime
+        return {"saved": self.output_file, "cells": count}
+
+
+    def status(self):
+        """Returns the state of the service"""
+        render_plans, sheets = self.loaded
+        return {"input_file": str(self.input_file), "sheets": len(sheets), "templates": len(render_plans),
+                "queued_cells": self.results.count(), "idle_sessions": len(self.session_pool.idle),
+                "logins": self.session_pool.logins, "session_reuses": self.session_pool.reuses}
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """Answers the requests with JSON, the WorkBookState is on the server"""
+
+    def do_GET(self):
+        state = self.server.state
+        path, query = self.get_request()
+        if path == "/sheets":
+            self.send_json(200, list(state.refresh()[1]))
+        elif path == "/status":
+            self.send_json(200, state.status())
+        else:
+            self.send_json(404, {"error": "Unknown path " + path})
+
+
+    def do_POST(self):
+        state = self.server.state
+        path, query = self.get_request()
+        sheetname = query.get("sheet", [None])[0]
+        started = time.perf_counter()
+        try:
+            if path == "/generate":
+                answer = state.generate(sheetname)
+            elif path == "/verify":
+                answer = state.verify(sheetname)
+            elif path == "/save":
+                answer = state.save()
+            elif path == "/reload":
+                with state.lock:
+                    state.load()
+                    state.results.clear()
+                answer = state.status()
+            else:
+                self.send_json(404, {"error": "Unknown path " + path})
+                return
+        except KeyError as e:
+            self.send_json(404, {"error": e.args[0]})
+            return
+        except ValueError as e:
+            self.send_json(400, {"error": str(e)})
+            return
+        except SystemExit:
+            # The WorkBook helpers exit on a broken WorkBook, the service keeps running
+            self.send_json(500, {"error": "The WorkBook could not be read, see the service output."})
+            return
+        if VERBOSE:
+            print("{} {} answered in {:.3f}s".format(path, sheetname or "", time.perf_counter() - started))
+        self.send_json(200, answer)
+
+
+    def get_request(self):
+        """Returns the path and the query parameters of the request"""
+        url = urlsplit(self.path)
+        return url.path, parse_qs(url.query)
+
+
+    def send_json(self, code, answer):
+        """Sends the answer as a JSON body"""
+        body = json.dumps(answer, indent=1, default=str).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def log_message(self, format, *args):
+        if VERBOSE:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+def start_service(state, bind="127.0.0.1", port=DEFAULT_PORT):
+    """Returns the HTTP server of the state, serve_forever() runs it"""
+    server = ThreadingHTTPServer((bind, port), ServiceHandler)
+    server.daemon_threads = True
+    server.state = state
+    return server
+
+
+###### MAIN ######
+def main():
+    setup_args = cli_args()
+    if setup_args["verbose"]:
+        global VERBOSE
+        VERBOSE = True
+        PortMatrixHelper.VERBOSE = True
+        Collector.VERBOSE = True
+        SessionPool.VERBOSE = True
+    # The network stack is loaded up front, the first request should not pay for it
+    PortMatrixHelper.load_network_modules()
+    session_pool = SessionPool.SessionPool(setup_args["idle_timeout"], setup_args["max_sessions"])
+    session_pool.start_eviction()
+    session_log = None
+    if setup_args["session_logs"]:
+        session_log = SessionLog.SessionLogWriter(setup_args["log_dir"], compress=setup_args["log_compress"])
+    state = WorkBookState(setup_args["input_file"], setup_args["output_file"], session_pool, setup_args,
+                          session_log)
+    server = start_service(state, setup_args["bind"], setup_args["port"])
+    if setup_args["bind"] not in LOCAL_ADDRESSES:
+        print("Warning: the service has no authentication, anyone who can reach {} can use it.".format(
+            setup_args["bind"]))
+    print("Serving {} on http://{}:{}".format(setup_args["input_file"], *server.server_address[:2]))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        session_pool.close_all()
+        if session_log is not None:
+            session_log.close()
+
+
+if __name__ == "__main__":
+    main()
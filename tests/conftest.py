@@ -0,0 +1,54 @@
+"""
+Shared setup of the tests. The scripts are run from the repository root, the
+TextFSM templates are found relative to it.
+"""
+import os
+import sys
+from pathlib import Path
+import pytest
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR))
+os.chdir(REPO_DIR)
+
+
+@pytest.fixture
+def get_setup_args(monkeypatch):
+    """Returns the PortMatrixHelper options parsed from a command line"""
+    import PortMatrixHelper
+    def parse(*argv):
+        monkeypatch.setattr(sys, "argv", ["PortMatrixHelper.py"] + list(argv))
+        return PortMatrixHelper.cli_args()
+    return parse
+
+
+SHEET_COUNT = 3
+ROW_COUNT = 10
+
+
+@pytest.fixture
+def capture_dir(tmp_path):
+    """Captured output of the synthetic devices, in the --replay layout"""
+    import Matrix.Synthetic as Synthetic
+    import Network.Network as Network
+    capture_dir = tmp_path / "captures"
+    for sheet_index in range(SHEET_COUNT):
+        host_dir = capture_dir / Synthetic.get_host(sheet_index)
+        host_dir.mkdir(parents=True)
+        outputs = {
+            Network.VERSION_CMD: Synthetic.build_version_output(sheet_index),
+            Network.CDP_CMD: Synthetic.build_cdp_output(sheet_index, ROW_COUNT),
+            Network.LLDP_CMD: Synthetic.build_lldp_output(sheet_index, ROW_COUNT)
+        }
+        for command, output in outputs.items():
+            (host_dir / (command.replace(" ", "_") + ".txt")).write_text(output)
+    return capture_dir
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    """A synthetic Port Matrix WorkBook of the devices in capture_dir"""
+    import Matrix.Synthetic as Synthetic
+    file_path = tmp_path / "PortMatrix.xlsx"
+    Synthetic.build_workbook(file_path, SHEET_COUNT, ROW_COUNT, column_count=9, template_count=2)
+    return file_path
@@ -0,0 +1,122 @@
+"""
+Stand-in SSH Server
+Answers the netmiko sessions of the tests from captured output in the
+'--replay' layout, <capture_dir>/<host>/<command>.txt, so the SSH code can
+be run without devices. The username of a login picks the captured host and
+the prompt is the Sheet name of that host.
+"""
+import socket
+import threading
+from pathlib import Path
+import paramiko
+
+# Logins with this password are rejected
+BAD_PASSWORD = "bad"
+
+
+class StandInServer:
+    """Listens on a free port of 127.0.0.1 until closed, one thread per session"""
+
+    def __init__(self, capture_dir):
+        self.capture_dir = Path(capture_dir)
+        self.key = paramiko.RSAKey.generate(1024)
+        self.logins = []
+        self.sock = socket.socket()
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(50)
+        self.port = self.sock.getsockname()[1]
+        self.thread = threading.Thread(target=self.__accept_loop, name="standin-ssh", daemon=True)
+        self.thread.start()
+
+
+    def close(self):
+        """Stops accepting sessions, the open ones end with the test process"""
+        self.sock.close()
+
+
+    def __accept_loop(self):
+        while True:
+            try:
+                client, address = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.__handle, args=(client,), daemon=True).start()
+
+
+    def __handle(self, client):
+        """Runs the SSH transport of one client and answers its shell"""
+        transport = paramiko.Transport(client)
+        transport.add_server_key(self.key)
+        server = Authenticator(self.logins)
+        transport.start_server(server=server)
+        channel = transport.accept(20)
+        if channel is None:
+            return
+        host = server.username
+        try:
+            self.__answer(channel, self.capture_dir/host, "SW" + host.split(".")[-1].zfill(4) + "#")
+        except (OSError, EOFError, paramiko.SSHException):
+            pass
+
+
+    def __answer(self, channel, host_dir, prompt):
+        """Echoes the input and answers every line with its captured output and the prompt"""
+        channel.send("\r\n" + prompt)
+        line = ""
+        last = ""
+        while True:
+            data = channel.recv(4096)
+            if not data:
+                return
+            for char in data.decode(errors="replace"):
+                previous, last = last, char
+                if char not in "\r\n":
+                    line += char
+                    channel.send(char)
+                    continue
+                # "\r\n" is one end of line
+                if char == "\n" and previous == "\r":
+                    continue
+                command, line = line.strip(), ""
+                if command == "exit":
+                    channel.close()
+                    return
+                output = ""
+                if command.startswith("show"):
+                    capture = host_dir/(command.replace(" ", "_") + ".txt")
+                    output = capture.read_text() if capture.exists() else "% Invalid input detected\n"
+                    output = output.rstrip("\n").replace("\n", "\r\n") + "\r\n"
+                channel.send("\r\n" + output + prompt)
+
+
+class Authenticator(paramiko.ServerInterface):
+    """Accepts any password but BAD_PASSWORD, the username is kept for the session"""
+
+    def __init__(self, logins):
+        self.logins = logins
+        self.username = None
+
+
+    def check_auth_password(self, username, password):
+        self.username = username
+        self.logins.append(username)
+        if password == BAD_PASSWORD:
+            return paramiko.AUTH_FAILED
+        return paramiko.AUTH_SUCCESSFUL
+
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED
+
+
+    def check_channel_shell_request(self, channel):
+        return True
+
+
+    def check_channel_pty_request(self, channel, term, width, height, pixelwidth, pixelheight, modes):
+        return True
@@ -0,0 +1,96 @@
+import time
+import threading
+import pytest
+import Matrix.Synthetic as Synthetic
+import Network.Collector as Collector
+import Network.Network as Network
+import Network.Replay as Replay
+
+
+class SlowReplay(Replay.ReplaySource):
+    """Captured output that takes 'delay' seconds to read for the slow hosts"""
+
+    def __init__(self, capture_dir, slow_hosts, delay):
+        super().__init__(capture_dir)
+        self.slow_hosts = slow_hosts
+        self.delay = delay
+
+
+    def get(self, host, device_type, commands):
+        if host in self.slow_hosts:
+            time.sleep(self.delay)
+        return super().get(host, device_type, commands)
+
+
+def new_devices(replay, count=2):
+    return [Network.NetworkDevice(host=Synthetic.get_host(index), username="admin", password="password",
+                                  secret="secret", device_type="cisco_ios", sheetname=Synthetic.get_sheet_name(index),
+                                  replay=replay)
+            for index in range(count)]
+
+
+@pytest.fixture(autouse=True)
+def fast_poll(monkeypatch):
+    monkeypatch.setattr(Collector, "POLL_INTERVAL", 0.05)
+
+
+def test_timed_out_device_is_not_changed_by_its_worker(capture_dir):
+    replay = SlowReplay(capture_dir, {Synthetic.get_host(0)}, delay=1)
+    net_devices = new_devices(replay)
+    collected = list(Collector.collect_devices(net_devices, workers=2, timeout=0.3))
+    assert [net_dev.status for net_dev in collected] == ["Data Gathered", "Timeout"]
+    # The worker of the timed out device finishes after it was handed back
+    time.sleep(1.2)
+    assert net_devices[0].status == "Timeout"
+    assert net_devices[0].cdp_neighbors == []
+    assert net_devices[1].status == "Data Gathered"
+    assert len(net_devices[1].cdp_neighbors) > 0
+
+
+def test_async_timeout_holds_the_slot_until_the_worker_returns(capture_dir):
+    replay = SlowReplay(capture_dir, {Synthetic.get_host(0)}, delay=0.6)
+    net_devices = new_devices(replay)
+    collected = list(Collector.collect_devices_async(net_devices, workers=1, timeout=0.4))
+    # The second host waits for the slot of the first one instead of timing out behind it
+    assert [(net_dev.host, net_dev.status) for net_dev in collected] == [
+        (Synthetic.get_host(0), "Timeout"), (Synthetic.get_host(1), "Data Gathered")
+    ]
+    time.sleep(0.4)
+    assert net_devices[0].status == "Timeout"
+    assert net_devices[0].cdp_neighbors == []
+
+
+class BrokenCache:
+    """Discovery cache that fails before any login"""
+
+    def get(self, host, device_type):
+        raise RuntimeError("cache is broken")
+
+
+def run_collection(collect, net_devices, **kwargs):
+    """Runs a backend in a thread, so a retry loop that never ends fails the test"""
+    collected = []
+    thread = threading.Thread(target=lambda: collected.extend(collect(net_devices, **kwargs)), daemon=True)
+    thread.start()
+    thread.join(10)
+    assert not thread.is_alive()
+    return collected
+
+
+@pytest.mark.parametrize("collect", [Collector.collect_devices, Collector.collect_devices_async])
+@pytest.mark.parametrize("attempts", [1, 3])
+def test_replay_failure_is_not_retried(capture_dir, collect, attempts):
+    (capture_dir / Synthetic.get_host(0) / (Network.LLDP_CMD.replace(" ", "_") + ".txt")).unlink()
+    net_devices = new_devices(Replay.ReplaySource(capture_dir))
+    collected = run_collection(collect, net_devices, attempts=attempts, backoff=0)
+    assert {net_dev.host: (net_dev.status, net_dev.attempts) for net_dev in collected} == {
+        Synthetic.get_host(0): ("Error", 1), Synthetic.get_host(1): ("Data Gathered", 1)
+    }
+
+
+@pytest.mark.parametrize("collect", [Collector.collect_devices, Collector.collect_devices_async])
+def test_failure_before_the_login_counts_as_an_attempt(collect):
+    net_devices = [Network.NetworkDevice(host="10.0.0.1", username="admin", password="password", secret="secret",
+                                         device_type="cisco_ios", sheetname="SW1", discovery_cache=BrokenCache())]
+    collected = run_collection(collect, net_devices, attempts=3, backoff=0)
+    assert [(net_dev.status, net_dev.attempts) for net_dev in collected] == [("Error", 3)]
@@ -0,0 +1,75 @@
+import json
+import time
+import PortMatrixHelper
+import Network.DiscoveryCache as DiscoveryCache
+import Network.Network as Network
+
+SHOW_OUTPUT = {"show version": [], "show cdp neigh detail": [], "show lldp neigh detail": []}
+
+
+def test_invalidate_cache_option_removes_the_host(tmp_path, monkeypatch, get_setup_args):
+    monkeypatch.chdir(tmp_path)
+    DiscoveryCache.DiscoveryCache().store("10.0.0.1", "cisco_ios", SHOW_OUTPUT)
+    DiscoveryCache.DiscoveryCache().store("10.0.0.2", "cisco_ios", SHOW_OUTPUT)
+    discovery_cache = PortMatrixHelper.get_discovery_cache(get_setup_args("--invalidate_cache", "10.0.0.1"))
+    assert discovery_cache.get("10.0.0.1", "cisco_ios") is None
+    assert discovery_cache.get("10.0.0.2", "cisco_ios") == SHOW_OUTPUT
+
+
+def test_no_cache_without_the_cache_options(get_setup_args):
+    assert PortMatrixHelper.get_discovery_cache(get_setup_args()) is None
+
+
+def test_malformed_entries_are_a_miss(tmp_path):
+    discovery_cache = DiscoveryCache.DiscoveryCache(tmp_path)
+    discovery_cache.store("10.0.0.1", "cisco_ios", SHOW_OUTPUT)
+    entry_path = next(tmp_path.glob("10.0.0.1_*.json"))
+    for entry in ({"show_output": SHOW_OUTPUT}, {"time": "yesterday", "show_output": SHOW_OUTPUT},
+                  {"time": time.time(), "show_output": []}, []):
+        entry_path.write_text(json.dumps(entry))
+        assert discovery_cache.get("10.0.0.1", "cisco_ios") is None
+
+
+def test_malformed_show_output_is_collected_again(tmp_path):
+    discovery_cache = DiscoveryCache.DiscoveryCache(tmp_path)
+    discovery_cache.store("10.0.0.1", "cisco_ios", {"show version": [{}]})
+    net_dev = Network.NetworkDevice(host="10.0.0.1", username="admin", password="password", secret="secret",
+                                    device_type="cisco_ios", sheetname="SW1", discovery_cache=discovery_cache)
+    assert net_dev.load_from_cache() is False
+    assert net_dev.status != "Data Gathered"
+
+
+def test_devices_with_the_same_file_name_do_not_share_entries(tmp_path):
+    discovery_cache = DiscoveryCache.DiscoveryCache(tmp_path)
+    other_output = {"show version": [{"hostname": "other"}], "show cdp neigh detail": [],
+                    "show lldp neigh detail": []}
+    discovery_cache.store("sw1_cisco", "ios", other_output)
+    discovery_cache.store("sw1", "cisco_ios", SHOW_OUTPUT)
+    discovery_cache.store("fe80::1", "cisco_ios", SHOW_OUTPUT)
+    assert discovery_cache.get("sw1_cisco", "ios") == other_output
+    assert discovery_cache.get("sw1", "cisco_ios") == SHOW_OUTPUT
+    assert discovery_cache.get("fe80__1", "cisco_ios") is None
+
+
+def test_entry_of_another_device_is_a_miss(tmp_path):
+    discovery_cache = DiscoveryCache.DiscoveryCache(tmp_path)
+    discovery_cache.store("10.0.0.1", "cisco_ios", SHOW_OUTPUT)
+    entry_path = next(tmp_path.glob("10.0.0.1_*.json"))
+    entry = json.loads(entry_path.read_text())
+    entry["host"] = "10.0.0.2"
+    entry_path.write_text(json.dumps(entry))
+    assert discovery_cache.get("10.0.0.1", "cisco_ios") is None
+
+
+def test_invalidate_leaves_the_entries_of_other_hosts(tmp_path):
+    discovery_cache = DiscoveryCache.DiscoveryCache(tmp_path)
+    discovery_cache.store("sw1", "cisco_ios", SHOW_OUTPUT)
+    discovery_cache.store("sw1_b", "cisco_ios", SHOW_OUTPUT)
+    unreadable = tmp_path / "sw1_b_cisco_nxos_0123456789ab.json"
+    unreadable.write_text("{trunc")
+    discovery_cache.invalidate("sw1")
+    assert discovery_cache.get("sw1", "cisco_ios") is None
+    assert discovery_cache.get("sw1_b", "cisco_ios") == SHOW_OUTPUT
+    assert unreadable.exists()
+    discovery_cache.invalidate("sw1_b", "cisco_ios")
+    assert discovery_cache.get("sw1_b", "cisco_ios") is None
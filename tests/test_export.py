@@ -0,0 +1,31 @@
+import sys
+import subprocess
+import openpyxl
+import pytest
+import Matrix.Synthetic as Synthetic
+from conftest import REPO_DIR, ROW_COUNT
+
+EXPORTED_ROWS = ROW_COUNT - ROW_COUNT // Synthetic.NO_TEMPLATE_EVERY
+
+
+def generate(workbook, export_dir, processes):
+    subprocess.run([sys.executable, "PortMatrixHelper.py", "-i", str(workbook), "-g", "--incremental",
+                    "--export_dir", str(export_dir), "-p", str(processes)],
+                   check=True, capture_output=True, cwd=REPO_DIR)
+    return (export_dir / (Synthetic.get_sheet_name(0) + ".cfg")).read_text()
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_incremental_export_keeps_every_row(workbook, tmp_path, processes):
+    export_dir = tmp_path / "exp"
+    first = generate(workbook, export_dir, processes)
+    assert first.count("! SW0000 row") == EXPORTED_ROWS
+    # Nothing changed, every row is skipped
+    assert generate(workbook, export_dir, processes) == first
+    wb_obj = openpyxl.load_workbook(workbook)
+    ws_obj = wb_obj[Synthetic.get_sheet_name(0)]
+    ws_obj.cell(Synthetic.HEADER_ROW + 2, 7).value = "changed description"
+    wb_obj.save(workbook)
+    changed = generate(workbook, export_dir, processes)
+    assert changed.count("! SW0000 row") == EXPORTED_ROWS
+    assert "changed description" in changed
@@ -0,0 +1,9 @@
+import pytest
+import Matrix.Incremental as Incremental
+
+
+@pytest.mark.parametrize("sidecar", ["{trunc", '{"version": 1}', "[]", '{"version": 1, "sheets": 5}'])
+def test_unreadable_sidecar_is_an_empty_cache(tmp_path, sidecar):
+    path = tmp_path / ("PortMatrix.xlsx" + Incremental.SIDECAR_SUFFIX)
+    path.write_text(sidecar)
+    assert Incremental.FingerprintCache(path).old == {}
@@ -0,0 +1,33 @@
+import PortMatrixHelper
+import Matrix.Workbook as Workbook
+import Network.Network as Network
+
+
+def new_device(**kwargs):
+    device_info = {"host": "10.0.0.1", "username": "admin", "password": "password", "secret": "secret",
+                   "device_type": "cisco_ios", "sheetname": "SW1"}
+    device_info.update(kwargs)
+    return Network.NetworkDevice(**device_info)
+
+
+def test_copy_collection_takes_the_retry_state():
+    collected = new_device()
+    collected.status = "Error"
+    collected.attempts = 1
+    collected.auth_failed = True
+    shared = new_device(sheetname="SW1-other-workbook")
+    shared.copy_collection(collected)
+    assert (shared.status, shared.attempts, shared.auth_failed) == ("Error", 1, True)
+    assert shared.should_retry() == collected.should_retry()
+
+
+def test_attempts_of_an_older_run_are_erased():
+    net_dev = new_device()
+    net_dev.status = "Connection Error"
+    results = Workbook.ResultWriter()
+    net_dev.attempts = 3
+    PortMatrixHelper.update_discovered_data(net_dev, results)
+    assert results.get("SW1", 6, 3) == "3 attempts"
+    net_dev.attempts = 1
+    PortMatrixHelper.update_discovered_data(net_dev, results)
+    assert results.get("SW1", 6, 3) == ""
@@ -0,0 +1,21 @@
+import socket
+import PortMatrixHelper
+import Network.Network as Network
+
+
+def new_device(port):
+    return Network.NetworkDevice(host="127.0.0.1", username="admin", password="password", secret="secret",
+                                 device_type="cisco_ios", sheetname="SW{}".format(port), port=port)
+
+
+def test_probe_uses_the_port_of_the_device():
+    with socket.socket() as listening, socket.socket() as closed:
+        listening.bind(("127.0.0.1", 0))
+        listening.listen()
+        closed.bind(("127.0.0.1", 0))
+        open_port, closed_port = listening.getsockname()[1], closed.getsockname()[1]
+        live_devices, unreachable = PortMatrixHelper.probe_net_devices(
+            [new_device(open_port), new_device(closed_port)], probe_timeout=1)
+    assert [net_dev.port for net_dev in live_devices] == [open_port]
+    assert [net_dev.port for net_dev in unreachable] == [closed_port]
+    assert unreachable[0].status == "Unreachable"
@@ -0,0 +1,14 @@
+import Matrix.Render as Render
+
+
+def test_malformed_templates_are_reported_and_skipped():
+    render_plans = Render.compile_templates({"Access": "interface {Port}\n description {Neighbor",
+                                             "Count": 5, "Trunk": "interface {Port}"})
+    assert render_plans["Trunk"].error is None
+    assert render_plans["Trunk"].fields == ["Port"]
+    issues = Render.find_template_issues("SW1", ["Port", "Neighbor"], render_plans, ["Access", "Count", "Trunk"])
+    assert len(issues) == 2
+    assert "'Access' which can not be compiled" in issues[0]
+    assert "'Count' which can not be compiled" in issues[1]
+    # A sheet that only uses the good template is not held up
+    assert Render.find_template_issues("SW2", ["Port"], render_plans, ["Trunk"]) == []
@@ -0,0 +1,30 @@
+import sqlite3
+import Network.ResultStore as ResultStore
+
+LINK = ("10.0.0.1", "SW1", 10, "Gi1/0/1", "SW2", "Gi1/0/2", "Not Verified", "")
+
+
+def test_only_completed_runs_are_listed(tmp_path):
+    store = ResultStore.ResultStore(tmp_path / "results.db")
+    store.start_run(tmp_path / "sites" / "PortMatrix.xlsx")
+    store.add_links("PortMatrix.xlsx", [LINK])
+    store.finish_run()
+    # A run that crashed before finishing
+    store.start_run(tmp_path / "PortMatrix.xlsx")
+    store.add_links("PortMatrix.xlsx", [LINK])
+    runs = store.get_runs()
+    assert [(run["run_id"], run["workbook"]) for run in runs] == [(1, "PortMatrix.xlsx")]
+    assert [link["run_id"] for link in store.get_failed_links()] == [1]
+    store.close()
+
+
+def test_runs_of_an_older_database_are_kept(tmp_path):
+    connection = sqlite3.connect(str(tmp_path / "results.db"))
+    connection.execute("CREATE TABLE runs (run_id INTEGER PRIMARY KEY AUTOINCREMENT, started TEXT NOT NULL, "
+                       "workbook TEXT NOT NULL, options TEXT)")
+    connection.execute("INSERT INTO runs (started, workbook) VALUES ('2026-01-01T10:00:00', 'PortMatrix.xlsx')")
+    connection.commit()
+    connection.close()
+    store = ResultStore.ResultStore(tmp_path / "results.db")
+    assert [run["run_id"] for run in store.get_runs()] == [1]
+    store.close()
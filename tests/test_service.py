@@ -0,0 +1,65 @@
+import sys
+import json
+import time
+import threading
+import urllib.request
+import openpyxl
+import pytest
+import Matrix.Synthetic as Synthetic
+import Network.SessionPool as SessionPool
+import PortMatrixService
+from conftest import SHEET_COUNT
+from standin_ssh import StandInServer
+
+IDLE_TIMEOUT = 1
+
+
+@pytest.fixture
+def standin(capture_dir):
+    server = StandInServer(capture_dir)
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def service(workbook, standin, monkeypatch):
+    """The service on a free port, every device is the stand-in server picked by its username"""
+    wb_obj = openpyxl.load_workbook(workbook)
+    for sheet_index in range(SHEET_COUNT):
+        ws_obj = wb_obj[Synthetic.get_sheet_name(sheet_index)]
+        ws_obj["B1"] = "127.0.0.1"
+        ws_obj["B2"] = Synthetic.get_host(sheet_index)
+    wb_obj.save(workbook)
+    monkeypatch.setattr(sys, "argv", ["PortMatrixService.py", "--ssh_port", str(standin.port), "-t", "60"])
+    session_pool = SessionPool.SessionPool(idle_timeout=IDLE_TIMEOUT)
+    state = PortMatrixService.WorkBookState(workbook, None, session_pool, PortMatrixService.cli_args())
+    server = PortMatrixService.start_service(state, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield "http://127.0.0.1:{}".format(server.server_address[1]), session_pool
+    server.shutdown()
+    server.server_close()
+    session_pool.close_all()
+
+
+def request(url, method="GET"):
+    with urllib.request.urlopen(urllib.request.Request(url, method=method), timeout=120) as answer:
+        return json.loads(answer.read())
+
+
+def test_verify_reuses_the_sessions_until_they_are_idle(service, standin):
+    url, session_pool = service
+    for verify in range(2):
+        answer = request(url + "/verify", "POST")
+        assert sorted(answer) == [Synthetic.get_sheet_name(index) for index in range(SHEET_COUNT)]
+        assert {sheet["status"] for sheet in answer.values()} == {"Complete"}
+        assert all(sheet["unmatched_rows"] == [] for sheet in answer.values())
+    status = request(url + "/status")
+    assert (status["logins"], status["session_reuses"], status["idle_sessions"]) == (SHEET_COUNT, SHEET_COUNT,
+                                                                                     SHEET_COUNT)
+    assert len(standin.logins) == SHEET_COUNT
+    time.sleep(IDLE_TIMEOUT + 0.1)
+    assert session_pool.evict_idle() == SHEET_COUNT
+    assert request(url + "/status")["idle_sessions"] == 0
+    # The evicted sessions are opened again
+    request(url + "/verify", "POST")
+    assert len(standin.logins) == 2 * SHEET_COUNT
@@ -0,0 +1,44 @@
+import sys
+import time
+import subprocess
+from pathlib import Path
+import PortMatrixBench
+
+RUNS = 3
+
+
+def run_help(*python_args):
+    """Runs 'PortMatrixHelper.py -h', returns the seconds it took and its stderr"""
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, *python_args, "PortMatrixHelper.py", "-h"], capture_output=True,
+                             text=True, check=True, cwd=Path(PortMatrixBench.__file__).parent)
+    return time.perf_counter() - start, process.stderr
+
+
+def get_interpreter_seconds():
+    """Seconds a bare interpreter takes to start, not part of the budget"""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], check=True)
+    return time.perf_counter() - start
+
+
+def test_help_is_within_the_startup_budget():
+    # The best of a few runs, a busy machine should not fail the budget
+    seconds = min(run_help()[0] - get_interpreter_seconds() for run in range(RUNS))
+    assert seconds <= PortMatrixBench.STARTUP_BUDGET
+
+
+def test_help_does_not_import_the_network_stack():
+    seconds, importtime = run_help("-X", "importtime")
+    imported = {line.split("|")[-1].strip().split(".")[0] for line in importtime.splitlines() if "|" in line}
+    assert not imported & set(PortMatrixBench.NETWORK_MODULES)
+
+
+def test_network_stack_is_loaded_on_first_use():
+    measures = [PortMatrixBench.measure_startup() for run in range(RUNS)]
+    seconds, loaded, network_seconds, network_loaded = min(measures)
+    assert seconds <= PortMatrixBench.STARTUP_BUDGET
+    assert loaded == []
+    # netmiko brings in paramiko and textfsm
+    assert network_loaded == sorted(PortMatrixBench.NETWORK_MODULES)
+    assert network_seconds > 0
@@ -0,0 +1,16 @@
+import openpyxl
+import Matrix.Workbook as Workbook
+
+
+def test_streamed_save_keeps_formulas(tmp_path):
+    wb_obj = openpyxl.Workbook()
+    ws_obj = wb_obj.active
+    ws_obj.title = "SW1"
+    ws_obj.append(["Port", "Count", "Total"])
+    ws_obj.append(["Gi1/0/1", 2, "=B2*2"])
+    wb_obj.save(tmp_path / "in.xlsx")
+    results = Workbook.ResultWriter()
+    results.write("SW1", 2, 4, "Verified")
+    Workbook.save_streamed(tmp_path / "in.xlsx", tmp_path / "out.xlsx", results)
+    saved = openpyxl.load_workbook(tmp_path / "out.xlsx")["SW1"]
+    assert [cell.value for cell in saved[2]] == ["Gi1/0/1", 2, "=B2*2", "Verified"]